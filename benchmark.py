@@ -0,0 +1,259 @@
+from __future__ import print_function,division
+#performance benchmarks that need no hardware, so they can run anywhere:
+#   python benchmark.py serial    frames/sec, bytes/frame and latency of each
+#                                 light-up mode, against fakearduino.py.
+#                                 exits with status 1 if any mode misses
+#                                 the --min-fps, --max-p95... limits
+#   python benchmark.py pipeline  time spent in each stage from samples
+#                                 arriving to the frame going out to the dress
+#   python benchmark.py startup   import times and how long 'dress.py run'
+#                                 takes to light up the dress
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import numpy
+import dress
+from fakearduino import FakeArduino
+
+def percentile(values,q):
+    if len(values)==0:
+        return float('nan')
+    return numpy.percentile(values,q)
+
+def benchmarkMode(method,seconds,baud,maxBaud):
+    fake=FakeArduino(maxBaud)
+    garment=dress.Dress(fake.port,baud)
+    garment.audio=dress.Audio(input=dress.ToneInput('sweep'))
+    garment.connect() #the handshake is not part of the run
+    garment.writer.log=[]
+    lightUp=threading.Thread(target=getattr(garment,method))
+    lightUp.daemon=True
+    started=dress.clock()
+    lightUp.start()
+    time.sleep(seconds)
+    garment.stop()
+    lightUp.join(10)
+    elapsed=dress.clock()-started
+    garment.close()
+    time.sleep(0.2) #let the last frames reach the fake
+    fake.close()
+    sent=garment.writer.log
+    applied=fake.frames
+    #the pty keeps the order, so the nth frame sent is the nth applied
+    latency=[done-queued for ((queued,written,size),(done,size2,pairs))\
+             in zip(sent,applied)]
+    return {'link':garment.link,
+            'fps':len(applied)/elapsed,
+            'bytes':numpy.mean([size for (queued,written,size) in sent])\
+                    if sent else 0,
+            'p50':percentile(latency,50)*1000,
+            'p95':percentile(latency,95)*1000,
+            'max':max(latency)*1000 if latency else float('nan'),
+            'dropped':garment.writer.dropped,
+            'missed':garment.schedule.missed,
+            'steps':garment.schedule.steps,
+            'bad':fake.badFrames}
+
+def serialFailures(result,args):
+    #what a mode's result falls short of, as messages
+    failures=[]
+    if result['fps']<args.min_fps:
+        failures.append('%0.1f frames/s, under %g'%(result['fps'],\
+                                                   args.min_fps))
+    if result['p95']>args.max_p95:
+        failures.append('p95 latency %0.2f ms, over %g ms'%\
+                        (result['p95'],args.max_p95))
+    if result['dropped']>args.max_dropped:
+        failures.append('%d frames dropped'%result['dropped'])
+    missed=100*result['missed']/max(result['steps'],1)
+    if missed>args.max_missed:
+        failures.append('%d of %d deadlines missed (%0.0f%%), over %g%%'%\
+                        (result['missed'],result['steps'],missed,\
+                         args.max_missed))
+    if result['bad']:
+        failures.append('%d frames failed their checksum'%result['bad'])
+    return failures
+
+def runSerial(args):
+    #True if every mode stays within the limits
+    passed=True
+    print('%-20s %9s %11s %12s %8s %8s %8s %8s'%('mode','frames/s',\
+          'bytes/frame','latency p50','p95','max','dropped','missed'))
+    for method in ['dressDemo','dressLightUpInMode1','dressLightUpInMode2']:
+        result=benchmarkMode(method,args.seconds,args.baud,args.max_baud)
+        print('%-20s %9.1f %11.1f %9.2f ms %5.2f ms %5.2f ms %8d %8d'%\
+              (method,result['fps'],result['bytes'],result['p50'],\
+               result['p95'],result['max'],result['dropped'],\
+               result['missed']))
+        for failure in serialFailures(result,args):
+            print('   FAIL:',failure)
+            passed=False
+    print('link:',result['link'])
+    return passed
+
+def runPipeline(args):
+    #follow every analysis window through the same steps the preview and
+    #the live dress modes take, timing each one. the preview's color step
+    #is the lookup it makes, so visual and wx are not needed here
+    fake=FakeArduino()
+    garment=dress.Dress(fake.port,args.baud)
+    realTime=not args.flat_out
+    if args.wav:
+        source=dress.WaveInput(args.wav,realTime)
+    else:
+        source=dress.ToneInput(args.signal,realTime=realTime)
+    sound=dress.Audio(args.detector,input=source)
+    stages=['getFrequency','findRGB','colorMode','emit']
+    times=dict((stage,[]) for stage in stages+['total'])
+    garment.connect() #the handshake is not part of the first emit
+    sound.setUp()
+    started=dress.clock()
+    chunks=0
+    while dress.clock()-started<args.seconds:
+        t0=dress.clock()
+        analysis=sound.record()
+        if analysis==None:
+            time.sleep(0.0005) #nothing new yet
+            continue
+        arrived=sound.audio.lastWrite
+        t1=dress.clock()
+        sound.findRGB()
+        t2=dress.clock()
+        sound.colors.lookup(args.color_mode,analysis.midi)
+        t3=dress.clock()
+        garment.setAll(sound.r,sound.g,sound.b)
+        garment.flush()
+        t4=dress.clock()
+        chunks+=1
+        for (stage,start,end) in zip(stages,[t0,t1,t2,t3],[t1,t2,t3,t4]):
+            times[stage].append(end-start)
+        times['total'].append(t4-arrived)
+    elapsed=dress.clock()-started
+    sound.stopRecording()
+    garment.close()
+    fake.close()
+    print('%s, %s detector, %s input'%\
+          ('flat out' if args.flat_out else 'real time',args.detector,\
+           args.wav or args.signal))
+    print('%-26s %10s %10s %10s'%('stage (ms)','p50','p95','p99'))
+    for stage in stages+['total']:
+        values=numpy.array(times[stage])*1000
+        print('%-26s %10.3f %10.3f %10.3f'%(stage,percentile(values,50),\
+              percentile(values,95),percentile(values,99)))
+    print('%0.1f chunks/sec sustained (%d in %0.1f s)'%\
+          (chunks/elapsed,chunks,elapsed))
+
+here=os.path.dirname(os.path.abspath(__file__))
+
+def importTime(module):
+    #seconds a fresh interpreter takes to import module, or the error if
+    #it cannot be imported here
+    child=subprocess.Popen([sys.executable,'-c',\
+                            'import time;started=time.time();import %s;'\
+                            'print(time.time()-started)'%module],\
+                           cwd=here,stdout=subprocess.PIPE,\
+                           stderr=subprocess.PIPE)
+    (out,err)=child.communicate()
+    if child.returncode!=0:
+        return err.decode().strip().splitlines()[-1]
+    return float(out)
+
+def firstLight(args):
+    #seconds from starting 'dress.py run' to the fake arduino showing its
+    #first frame: starting python, imports, the handshake and the first
+    #sweep step. None if nothing arrived in time
+    fake=FakeArduino(args.max_baud)
+    command=[sys.executable,os.path.join(here,'dress.py'),'run',\
+             '--mode','demo','--port',fake.port]
+    if args.baud!=None:
+        command+=['--baud',str(args.baud)]
+    started=dress.clock()
+    child=subprocess.Popen(command,stdout=subprocess.PIPE)
+    while not fake.frames and child.poll()==None and \
+          dress.clock()-started<args.timeout:
+        time.sleep(0.001)
+    light=fake.frames[0][0]-started if fake.frames else None
+    if child.poll()==None:
+        child.send_signal(signal.SIGINT) #the dress goes dark and lets go
+        child.wait()
+    fake.close()
+    return light
+
+def runStartup(args):
+    for module in ['dress','preview']:
+        result=importTime(module)
+        if isinstance(result,float):
+            print('%-22s %8.3f s'%('import '+module,result))
+        else:
+            print('%-22s %s'%('import '+module,result))
+    lights=[firstLight(args) for run in range(args.runs)]
+    if None in lights:
+        print('no light within %g s in %d of %d runs'%\
+              (args.timeout,lights.count(None),args.runs))
+    lights=[light for light in lights if light!=None]
+    if lights:
+        print('%-22s %8.3f s   (best %0.3f s, %d runs)'%\
+              ('first light',numpy.median(lights),min(lights),len(lights)))
+
+def main():
+    dress.loadPalettes()
+    parser=argparse.ArgumentParser(description='Musical Garment benchmarks')
+    suites=parser.add_subparsers(dest='suite')
+    serial=suites.add_parser('serial',\
+                             help='each light-up mode against a fake arduino')
+    serial.add_argument('--seconds',type=float,default=5,\
+                        help='how long to run each mode')
+    serial.add_argument('--baud',type=int,default=None,\
+                        help='fix the baud rate instead of negotiating')
+    serial.add_argument('--max-baud',type=int,default=1000000,\
+                        help='fastest rate the fake arduino handles')
+    #limits a mode must stay within; the modes show 5-7 frames/s, so
+    #less than 4 means they have slowed down
+    serial.add_argument('--min-fps',type=float,default=4)
+    serial.add_argument('--max-p95',type=float,default=20,\
+                        help='latency limit in ms (default: %(default)s)')
+    serial.add_argument('--max-dropped',type=int,default=0)
+    #a one-off stall of the machine running the benchmark costs a deadline
+    #or two, which should not fail a build
+    serial.add_argument('--max-missed',type=float,default=5,\
+                        help='percent of deadlines a mode may miss'\
+                             ' (default: %(default)s)')
+    pipeline=suites.add_parser('pipeline',\
+                               help='latency of each stage of the pipeline')
+    pipeline.add_argument('--seconds',type=float,default=10)
+    pipeline.add_argument('--detector',choices=sorted(dress.pitchDetectors),\
+                          default='fft')
+    pipeline.add_argument('--signal',default='sweep',\
+                          choices=['sweep','chord','noise','silence'])
+    pipeline.add_argument('--wav',help='play this file instead of a signal')
+    pipeline.add_argument('--color-mode',default='multicolor',\
+                          choices=list(dress.colorMappers))
+    pipeline.add_argument('--flat-out',action='store_true',\
+                          help='feed samples as fast as they can be analysed'\
+                               ' to find the sustained throughput')
+    pipeline.add_argument('--baud',type=int,default=None)
+    startup=suites.add_parser('startup',\
+                              help="import times and 'dress.py run' to the"\
+                                   ' first frame on a fake arduino')
+    startup.add_argument('--runs',type=int,default=5)
+    startup.add_argument('--timeout',type=float,default=20,\
+                         help='seconds to wait for the first frame')
+    startup.add_argument('--baud',type=int,default=None)
+    startup.add_argument('--max-baud',type=int,default=1000000)
+    args=parser.parse_args()
+    if args.suite=='serial':
+        if not runSerial(args):
+            sys.exit(1)
+    elif args.suite=='pipeline':
+        runPipeline(args)
+    elif args.suite=='startup':
+        runStartup(args)
+    else:
+        parser.print_help()
+
+if __name__=='__main__':
+    main()
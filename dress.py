@@ -1,30 +1,880 @@
 from __future__ import print_function,division
-from visual import *
-import wx
-import pyaudio
 import numpy
 import math
 import threading
-import serial
+try:
+    import queue
+except ImportError: #python 2
+    import Queue as queue
 import time
+import sys
+import traceback
+import wave
+import struct
+import argparse
+import json
+import os
+from collections import OrderedDict
+from numpy.lib.stride_tricks import as_strided
 
 def rgbString(red, green, blue):
     return "#%02x%02x%02x" % (red, green, blue)
 
+#time.monotonic never jumps with the wall clock, but python 2 lacks it
+clock=getattr(time,'monotonic',time.time)
+
+def refinePeaks(y,which):
+    #for each row of y (already on a log scale) the offset of the true peak
+    #from bin which, from a parabola through the bin and its two neighbours
+    rows=numpy.arange(len(which))
+    inner=numpy.minimum(numpy.maximum(which,1),y.shape[1]-2)
+    y0,y1,y2=y[rows,inner-1],y[rows,inner],y[rows,inner+1]
+    denominator=2*y1-y2-y0
+    offset=numpy.zeros(len(which))
+    ok=(inner==which)&(denominator!=0)&numpy.isfinite(y0+y1+y2)
+    offset[ok]=(y2[ok]-y0[ok])*.5/denominator[ok]
+    return offset
+
+class RingBuffer:
+    #fixed-size sample history, written by one thread and read by others.
+    #every sample is stored twice (at i and at i+size) so the most recent
+    #window is always one contiguous slice: readers get a view, never a copy,
+    #and never have to wait on a lock
+    def __init__(self,size,dtype):
+        self.size=size
+        self.dtype=dtype
+        self.data=numpy.zeros(2*size,dtype=dtype)
+        self.written=0 #samples written so far, only the writer changes it
+        self.lastWrite=None #clock() when the newest samples arrived
+
+    def write(self,samples):
+        n=len(samples)
+        if n>self.size:
+            #only the newest samples fit
+            self.written+=n-self.size
+            samples=samples[n-self.size:]
+            n=self.size
+        start=self.written%self.size
+        first=min(n,self.size-start)
+        self.data[start:start+first]=samples[:first]
+        self.data[start+self.size:start+self.size+first]=samples[:first]
+        if first<n:
+            self.data[:n-first]=samples[first:]
+            self.data[self.size:self.size+n-first]=samples[first:]
+        #publish the new samples only once they are in place
+        self.lastWrite=clock()
+        self.written+=n
+
+    def window(self,end,n):
+        #the n samples ending at sample number end, oldest first, as a view.
+        #end must be one of the last self.size samples written
+        end=end%self.size+self.size
+        return self.data[end-n:end]
+
+    def latest(self,n):
+        #the newest n samples
+        return self.window(self.written,n)
+
+class ColorHistory:
+    #the most recent colors, newest first, for the patterns that pass each
+    #color along the dress. as in RingBuffer every color is stored twice,
+    #capacity apart, so the newest colors are always one contiguous slice:
+    #push() is O(1) and the views copy nothing
+    def __init__(self,capacity,dtype=float):
+        self.capacity=capacity
+        self.colors=numpy.zeros((2*capacity,3),dtype=dtype)
+        self.start=0 #where the newest color is
+        self.count=0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count=0
+
+    def push(self,rgb):
+        #new colors go in below the old ones, so newest first reads upwards
+        self.start=(self.start-1)%self.capacity
+        self.colors[self.start]=rgb
+        self.colors[self.start+self.capacity]=rgb
+        self.count=min(self.count+1,self.capacity)
+
+    def newest(self,n):
+        #the newest n colors (fewer if there are not that many yet), newest
+        #first, as a view
+        return self.colors[self.start:self.start+min(n,self.count)]
+
+    def dropping(self,slots):
+        #(slot numbers, colors) for a pattern where slot i shows the color
+        #from i frames ago, like the waterfall dropping from the top hoop
+        colors=self.newest(slots)
+        return numpy.arange(len(colors)),colors
+
+    def expanding(self,top,slots):
+        #(slot numbers, colors) for a pattern where the newest color is in
+        #slots top-1 and top, and older ones spread out from there towards
+        #slot 0 and slot slots-1, like the rows above and below the waist.
+        #slots with no color yet are left out
+        ages=numpy.concatenate((numpy.arange(top)[::-1],\
+                                numpy.arange(slots-top)))
+        which=numpy.flatnonzero(ages<self.count)
+        return which,self.colors[self.start+ages[which]]
+
+class SlidingWindow:
+    #hands out an analysis window every hopSize new samples, so how often the
+    #pitch updates (hop) and how low a note it can resolve (window length)
+    #are tuned separately. windows overlap whenever hopSize<windowSize
+    def __init__(self,ring,windowSize,hopSize):
+        self.ring=ring
+        self.windowSize=windowSize
+        self.hopSize=hopSize
+        self.position=0 #sample number the last window ended at
+
+    def next(self):
+        #the newest full window (a view into the ring), or None if less
+        #than a hop has arrived
+        written=self.ring.written
+        if written-self.position<self.hopSize:
+            return None
+        #if we fell behind, skip straight to the newest hop boundary:
+        #the lights only care about the current pitch
+        self.position=written-(written-self.position)%self.hopSize
+        return self.ring.window(self.position,self.windowSize)
+
+class SpectrumPlan:
+    #everything the fft needs for one window length and sample rate, worked
+    #out once: the window function, the bin frequency tables and all the
+    #buffers. each window is then analysed in place, without new arrays
+    def __init__(self,windowSize,rate):
+        self.windowSize=windowSize
+        self.rate=rate
+        self.bins=windowSize//2+1
+        self.window=numpy.hanning(windowSize)
+        self.samples=numpy.zeros(windowSize) #scaled to -1..1
+        self.windowed=numpy.zeros(windowSize)
+        self.spectrum=numpy.zeros(self.bins,dtype=complex)
+        self.power=numpy.zeros(self.bins)
+        self.binHz=numpy.arange(self.bins)*rate/windowSize
+        #numpy only takes an out buffer for rfft from 2.0 on
+        try:
+            numpy.fft.rfft(self.windowed,out=self.spectrum)
+            self.rfftOut=True
+        except TypeError:
+            self.rfftOut=False
+
+    def load(self,data):
+        #copy a window of int16 samples into the float buffer
+        numpy.multiply(data,1/32768.0,out=self.samples)
+
+    #modified from code found on https://pypi.python.org/pypi/SoundAnalyse
+    def loudness(self):
+        #return value is in dB
+        #loudness ranges from -80dB(no sound) to 0dB(maximum loudness)
+        #typical silence is -36dB
+        ms=math.sqrt(numpy.dot(self.samples,self.samples)/self.windowSize)
+        if ms<10e-8:
+            ms=10e-8
+        return 10.0*math.log(ms,10.0)
+
+    def transform(self):
+        #power spectrum of the loaded window, left in self.power
+        numpy.multiply(self.samples,self.window,out=self.windowed)
+        if self.rfftOut:
+            numpy.fft.rfft(self.windowed,out=self.spectrum)
+        else:
+            self.spectrum[:]=numpy.fft.rfft(self.windowed)
+        numpy.abs(self.spectrum,out=self.power)
+        numpy.multiply(self.power,self.power,out=self.power)
+        return self.power
+
+    def loudnessBatch(self,frames):
+        #loudness in dB of every row of frames, as in loudness()
+        x=frames/32768.0
+        ms=numpy.sqrt(numpy.einsum('ij,ij->i',x,x)/self.windowSize)
+        return 10.0*numpy.log10(numpy.maximum(ms,10e-8))
+
+    def transformBatch(self,frames):
+        #power spectra of many windows, one per row, in a single batched rfft
+        power=numpy.abs(numpy.fft.rfft(frames*(self.window/32768.0),axis=1))
+        power*=power
+        return power
+
+    def peakFrequency(self):
+        #frequency of the strongest bin, refined by fitting a parabola to
+        #the log power around it
+        power=self.power
+        which=power[1:].argmax()+1
+        if which==self.bins-1 or power[which-1]<=0 or power[which+1]<=0:
+            return self.binHz[which]
+        y0=math.log(power[which-1])
+        y1=math.log(power[which])
+        y2=math.log(power[which+1])
+        denominator=2*y1-y2-y0
+        if denominator==0: #flat around the peak, as for a click
+            return self.binHz[which]
+        x1=(y2-y0)*.5/denominator
+        return (which+x1)*self.rate/self.windowSize
+
+class FFTPeakDetector:
+    #the strongest fft bin, refined with parabolic interpolation.
+    #needs long windows to tell low notes apart and can lock onto a loud
+    #harmonic instead of the fundamental
+    windowSize=8192
+    def __init__(self,plan):
+        self.plan=plan
+
+    def detect(self):
+        return self.plan.peakFrequency()
+
+    def detectBatch(self,frames):
+        #detect() for every row of frames at once
+        plan=self.plan
+        power=plan.transformBatch(frames)
+        which=power[:,1:].argmax(axis=1)+1
+        with numpy.errstate(divide='ignore'):
+            offset=refinePeaks(numpy.log(power),which)
+        return (which+offset)*plan.rate/plan.windowSize
+
+class YinDetector:
+    #YIN (de Cheveigne and Kawahara, 2002): the shortest lag at which the
+    #window matches a shifted copy of itself. it only needs two periods of
+    #the lowest note in the window: 4096 samples reach down to E1 (41Hz),
+    #the bottom of a bass guitar
+    windowSize=4096
+    threshold=0.15
+    maxFreq=4200 #top of the piano
+    def __init__(self,plan):
+        self.plan=plan
+        n=plan.windowSize
+        self.maxLag=n//2
+        self.minLag=max(2,int(plan.rate/self.maxFreq))
+        self.width=n-self.maxLag #samples compared at each lag
+        self.head=numpy.zeros(n) #the first width samples, zero padded
+        self.squares=numpy.zeros(n)
+        self.energy=numpy.zeros(n+1) #energy[i] is the sum of squares before i
+        self.diff=numpy.zeros(self.maxLag)
+        self.total=numpy.zeros(self.maxLag)
+        self.cmnd=numpy.ones(self.maxLag)
+
+    def detect(self):
+        x=self.plan.samples
+        width,maxLag=self.width,self.maxLag
+        #correlation of the first width samples with every lag, via the fft
+        self.head[:width]=x[:width]
+        corr=numpy.fft.irfft(numpy.fft.rfft(x)*\
+                             numpy.conj(numpy.fft.rfft(self.head)))[:maxLag]
+        #difference function d(lag)=e(0)+e(lag)-2*corr(lag)
+        numpy.multiply(x,x,out=self.squares)
+        numpy.cumsum(self.squares,out=self.energy[1:])
+        d=self.diff
+        numpy.subtract(self.energy[width:width+maxLag],self.energy[:maxLag],\
+                       out=d)
+        d+=self.energy[width]
+        d-=2*corr
+        d[0]=0
+        #cumulative mean normalized difference, 1 where it is undefined
+        numpy.cumsum(d,out=self.total)
+        self.cmnd[0]=1
+        numpy.multiply(d[1:],numpy.arange(1,maxLag),out=self.cmnd[1:])
+        numpy.divide(self.cmnd[1:],self.total[1:],out=self.cmnd[1:],\
+                     where=self.total[1:]>0)
+        self.cmnd[1:][self.total[1:]<=0]=1
+        cmnd=self.cmnd
+        #first dip under the threshold, followed down to its bottom
+        below=numpy.nonzero(cmnd[self.minLag:]<self.threshold)[0]
+        if len(below)>0:
+            lag=below[0]+self.minLag
+            while lag+1<maxLag and cmnd[lag+1]<cmnd[lag]:
+                lag+=1
+        else:
+            lag=cmnd[self.minLag:].argmin()+self.minLag
+        if 0<lag<maxLag-1:
+            s0,s1,s2=cmnd[lag-1],cmnd[lag],cmnd[lag+1]
+            if s0-2*s1+s2!=0:
+                lag=lag+(s0-s2)/(2*(s0-2*s1+s2))
+        return self.plan.rate/lag
+
+class HPSDetector:
+    #harmonic product spectrum: the spectrum times copies of itself squeezed
+    #by 2,3,4... only the fundamental lines up with all of its harmonics,
+    #so a single loud harmonic no longer wins
+    windowSize=4096
+    harmonics=4
+    #a fundamental must itself be within this many dB of the loudest bin,
+    #otherwise noise under a pure tone wins with the tone as its "harmonic".
+    #anything quieter counts as this much, so a missing harmonic costs every
+    #candidate the same instead of the window's leakage deciding
+    floor=40
+    def __init__(self,plan):
+        self.plan=plan
+        self.bins=plan.bins//self.harmonics
+        self.logPower=numpy.zeros((1,plan.bins))
+        self.clamped=numpy.zeros(plan.bins)
+        self.product=numpy.zeros(self.bins) #sum of logs, so no underflow
+
+    def detect(self):
+        plan=self.plan
+        logPower=self.logPower[0]
+        numpy.add(plan.power,1e-20,out=logPower)
+        numpy.log(logPower,out=logPower)
+        floor=logPower.max()-self.floor*math.log(10)/10
+        numpy.maximum(logPower,floor,out=self.clamped)
+        product=self.product
+        product[:]=self.clamped[:self.bins]
+        self.addHarmonics(self.clamped,product)
+        product[self.candidates(self.logPower,floor)[0]==False]=-numpy.inf
+        which=product[1:].argmax()+1
+        return self.refine(self.logPower,numpy.array([which]))[0]
+
+    def detectBatch(self,frames):
+        #detect() for every row of frames at once
+        plan=self.plan
+        logPower=numpy.log(plan.transformBatch(frames)+1e-20)
+        floor=logPower.max(axis=1)-self.floor*math.log(10)/10
+        clamped=numpy.maximum(logPower,floor[:,None])
+        product=clamped[:,:self.bins].copy()
+        self.addHarmonics(clamped,product)
+        product[self.candidates(logPower,floor)==False]=-numpy.inf
+        which=product[:,1:].argmax(axis=1)+1
+        return self.refine(logPower,which)
+
+    def candidates(self,logPower,floor):
+        #which of the first bins of each row could be a fundamental: a peak
+        #of the spectrum above the floor, not the skirt of a louder bin
+        fundamentals=logPower[:,:self.bins+1]
+        inner=fundamentals[:,1:-1]
+        isPeak=numpy.zeros(inner.shape[:1]+(self.bins,),dtype=bool)
+        isPeak[:,1:]=(inner>=fundamentals[:,:-2])&(inner>=fundamentals[:,2:])
+        return isPeak&(logPower[:,:self.bins]>=numpy.reshape(floor,(-1,1)))
+
+    def addHarmonics(self,clamped,product):
+        #add harmonics 2,3... of every bin to product. harmonic h of a
+        #fundamental in bin b can be up to h/2 bins from bin h*b, so it is
+        #taken as the loudest bin that close; otherwise a fundamental off
+        #the middle of its bin loses to the octave above it
+        spread=clamped
+        radius=0
+        for h in range(2,self.harmonics+1):
+            while radius<h//2:
+                radius+=1
+                wider=spread.copy()
+                numpy.maximum(wider[...,1:],spread[...,:-1],out=wider[...,1:])
+                numpy.maximum(wider[...,:-1],spread[...,1:],\
+                              out=wider[...,:-1])
+                spread=wider
+            product+=spread[...,::h][...,:self.bins]
+
+    def refine(self,logPower,which):
+        #the frequency of each row's chosen bin, from the spectrum itself:
+        #the harmonics only line up to the nearest bin, so the product is
+        #no guide to where between bins the fundamental lies
+        plan=self.plan
+        return (which+refinePeaks(logPower,which))*plan.rate/plan.windowSize
+
+#the pitch detection engines Audio can be started with
+pitchDetectors={'fft':FFTPeakDetector,'yin':YinDetector,'hps':HPSDetector}
+
+class AudioInput:
+    #owns the input device for a whole session: the device and stream are
+    #opened once and kept running until close(), instead of once per frame.
+    #in 'callback' mode pyaudio pushes samples into the ring buffer on its own
+    #thread and read() never blocks; 'blocking' mode reads from the stream.
+    #pyaudio is only imported on open(), so nothing that never records from
+    #the microphone (the timeline player, the benchmarks) needs it
+    def __init__(self,channels,rate,chunkSize,ring,mode='callback'):
+        self.channels=channels
+        self.rate=rate
+        self.chunkSize=chunkSize
+        self.ring=ring
+        self.mode=mode
+        self.framesPerBuffer=1024 #small callbacks keep the ring fresh
+        self.p=None
+        self.stream=None
+
+    def isOpen(self):
+        return self.stream!=None
+
+    def open(self):
+        if self.isOpen():
+            return
+        import pyaudio
+        self.p=pyaudio.PyAudio()
+        self.format=self.p.get_format_from_width(self.ring.data.itemsize)
+        self.paContinue=pyaudio.paContinue
+        if self.mode=='callback':
+            self.stream=self.p.open(format=self.format,\
+                                    channels=self.channels,\
+                                    rate=self.rate,input=True,\
+                                    frames_per_buffer=self.framesPerBuffer,\
+                                    stream_callback=self.callback)
+        else:
+            self.stream=self.p.open(format=self.format,\
+                                    channels=self.channels,\
+                                    rate=self.rate,input=True,\
+                                    frames_per_buffer=self.chunkSize)
+
+    def callback(self,inData,frameCount,timeInfo,status):
+        #runs on pyaudio's thread, so it does nothing but store the samples
+        self.ring.write(numpy.frombuffer(inData,dtype=self.ring.dtype))
+        return (None,self.paContinue)
+
+    def read(self):
+        #the most recent chunk of samples
+        if self.mode=='callback':
+            return self.ring.latest(self.chunkSize)
+        #the stream keeps filling while we are busy drawing, so skip what
+        #piled up and hand back the most recent chunk
+        stale=self.stream.get_read_available()-self.chunkSize
+        if stale>0:
+            self.stream.read(stale,exception_on_overflow=False)
+        audioString=self.stream.read(self.chunkSize,\
+                                     exception_on_overflow=False)
+        return numpy.frombuffer(audioString,dtype=self.ring.dtype)
+
+    def close(self):
+        if not self.isOpen():
+            return
+        self.stream.stop_stream()
+        self.stream.close()
+        self.p.terminate()
+        self.stream=None
+        self.p=None
+
+class GeneratedInput:
+    #an input that is not the microphone. a thread writes blocks of samples
+    #into the ring the way pyaudio's callback does, so nothing else can tell
+    #the difference. realTime=False writes as fast as it can, for
+    #benchmarks. subclasses define block(n), the next n samples
+    blockSize=1024
+    def __init__(self,rate=44100,realTime=True):
+        self.rate=rate
+        self.realTime=realTime
+        self.ring=None #set by Audio
+        self.chunkSize=None
+        self.thread=None
+
+    def isOpen(self):
+        return self.thread!=None
+
+    def open(self):
+        if self.isOpen():
+            return
+        self.playing=True
+        self.thread=threading.Thread(target=self.run)
+        self.thread.daemon=True
+        self.thread.start()
+
+    def run(self):
+        started=clock()
+        written=0
+        while self.playing:
+            self.ring.write(self.block(self.blockSize))
+            written+=self.blockSize
+            wait=started+written/self.rate-clock()
+            if self.realTime and wait>0:
+                time.sleep(wait)
+
+    def read(self):
+        #the most recent chunk, as in AudioInput's callback mode
+        return self.ring.latest(self.chunkSize)
+
+    def close(self):
+        if self.isOpen():
+            self.playing=False
+            self.thread.join()
+            self.thread=None
+
+class ToneInput(GeneratedInput):
+    #synthetic test signals:
+    #   'sweep'    a sine gliding from 55Hz up to 1760Hz and back every
+    #              period seconds
+    #   'chord'    the notes in freqs (default a C major triad) together
+    #   'noise'    white noise
+    #   'silence'  nothing at all
+    def __init__(self,signal='sweep',rate=44100,realTime=True,period=10,\
+                 freqs=(261.63,329.63,392.0),level=0.3):
+        GeneratedInput.__init__(self,rate,realTime)
+        self.signal=signal
+        self.period=period
+        self.freqs=freqs
+        self.amplitude=level*32767
+        self.position=0 #samples generated so far
+        self.phase=0.0
+        self.random=numpy.random.RandomState(0)
+
+    def block(self,n):
+        t=(self.position+numpy.arange(n))/self.rate
+        self.position+=n
+        if self.signal=='sweep':
+            #five octaves up in the first half of the period, down in the
+            #second; the phase is carried over so the glide has no clicks
+            octaves=5*(1-abs(1-2*(t/self.period)%2))
+            phases=self.phase+numpy.cumsum(2*math.pi*55*2**octaves/self.rate)
+            self.phase=phases[-1]%(2*math.pi)
+            x=numpy.sin(phases)
+        elif self.signal=='chord':
+            x=sum(numpy.sin(2*math.pi*f*t) for f in self.freqs)/len(self.freqs)
+        elif self.signal=='noise':
+            x=self.random.uniform(-1,1,n)
+        else:
+            x=numpy.zeros(n)
+        return (x*self.amplitude).astype(numpy.int16)
+
+class WaveInput(GeneratedInput):
+    #a wav file played into the ring, from the start again when it ends
+    def __init__(self,path,realTime=True):
+        (samples,rate)=readWave(path)
+        GeneratedInput.__init__(self,rate,realTime)
+        self.samples=samples.astype(numpy.int16)
+        self.position=0
+
+    def block(self,n):
+        which=(self.position+numpy.arange(n))%len(self.samples)
+        self.position=(self.position+n)%len(self.samples)
+        return self.samples[which]
+
+#the color modes: functions from a pitch in midinum, or an array of them,
+#to (r,g,b), 0-1
+
+def findRed(midi):
+    #the lower the frequency, the more red 
+    maxMidi=127
+    h=maxMidi/(math.pi/2-50/127*math.pi/2)
+    return numpy.where(midi<50,1,numpy.where(midi>100,0,numpy.cos(midi/h)))
+
+def findBlue(midi):
+    #the higher the frequency, the more blue
+    maxMidi=127
+    return 2**(midi/maxMidi)-1
+
+def findGreen(midi):
+    #midium frequency has the most green
+    maxMidi=127
+    h=maxMidi/(math.pi-50/127*math.pi)
+    return numpy.where(midi<50,0,abs(numpy.sin(midi/h+50/127*math.pi)))
+
+def findMulticolor(midi):
+    return (findRed(midi),findGreen(midi),findBlue(midi))
+
+def findDressColor(midi):
+    #the colors sent to the dress, 0-255: multicolor, except that red is
+    #very hard to show so whenever red dominates we want it to dominate more
+    maxRgbCode=255
+    rgb=(maxRgbCode*numpy.column_stack(findMulticolor(midi))).astype(int)
+    redDominates=rgb[:,0]==rgb.max(axis=1)
+    rgb[redDominates,1:]=(rgb[redDominates,1:]*0.2).astype(int)
+    return rgb
+
+def findRedIfRedOnly(midi):
+    #the higher the frequency, the more red 
+    maxMidi=127
+    h=maxMidi/(math.pi/2)
+    rgbCode=numpy.sin(midi/h)
+    return (rgbCode,0,0)
+
+def findYellow(midi):
+    #the higher the frequency, the more yellow
+    maxMidi=127
+    h=maxMidi/(math.pi/2)
+    rgbCode=numpy.sin(midi/h)
+    return (rgbCode,rgbCode,0)
+
+def findGreenIfGreenOnly(midi):
+    #the higher the frequency, the more green
+    maxMidi=127
+    h=maxMidi/(math.pi/2)
+    rgbCode=numpy.sin(midi/h)
+    return (0,rgbCode,0)
+
+def findPurple(midi):
+    #the higher the frequency, the more purple
+    maxMidi=127
+    h=maxMidi/(math.pi/2)
+    rgbCode=numpy.sin(midi/h)
+    return (rgbCode,0,rgbCode)
+
+def findBlueIfBlueOnly(midi):
+    #the higher the frequency, the more blue
+    maxMidi=127
+    h=maxMidi/(math.pi/2)
+    rgbCode=numpy.sin(midi/h)
+    return (0,0,rgbCode)
+
+class Palette:
+    #a color mode read from a json file in palettes/, such as
+    #   {"label": "Sunset Mode",
+    #    "stops": [[36, [80, 0, 120]], [60, [255, 60, 0]], [96, [255, 200, 0]]]}
+    #each stop is a pitch in midinum and the (r,g,b) there, 0-255. pitches
+    #between stops blend the colors on either side; pitches beyond the
+    #first or last stop keep its color
+    def __init__(self,path):
+        with open(path) as f:
+            try:
+                spec=json.load(f)
+                stops=sorted((float(midi),[float(c) for c in rgb])\
+                             for (midi,rgb) in spec['stops'])
+            except (ValueError,KeyError,TypeError) as e:
+                raise ValueError('%s is not a palette: %s'%(path,e))
+        if len(stops)==0 or any(len(rgb)!=3 for (midi,rgb) in stops):
+            raise ValueError('%s needs stops of [midi, [r, g, b]]'%path)
+        name=os.path.splitext(os.path.basename(path))[0]
+        self.label=spec.get('label',name.title()+' Mode')
+        self.midi=numpy.array([midi for (midi,rgb) in stops])
+        self.rgb=numpy.array([rgb for (midi,rgb) in stops])/255
+
+    def findColor(self,midi):
+        return tuple(numpy.interp(midi,self.midi,self.rgb[:,i])\
+                     for i in range(3))
+
+#every color mode, in the order the menu lists them: name -> (label in the
+#menu, function from pitch to color). palettes are added by loadPalettes
+colorMappers=OrderedDict([
+    ('red',('Red Only Mode',findRedIfRedOnly)),
+    ('yellow',('Yellow Only Mode',findYellow)),
+    ('green',('Green Only Mode',findGreenIfGreenOnly)),
+    ('purple',('Purple Only Mode',findPurple)),
+    ('blue',('Blue Only Mode',findBlueIfBlueOnly)),
+    ('multicolor',('Multicolor Mode',findMulticolor))])
+
+paletteDirectory=os.path.join(os.path.dirname(os.path.abspath(__file__)),\
+                              'palettes')
+
+def loadPalettes(directory=paletteDirectory):
+    #register every .json palette in directory as a color mode named after
+    #its file. Audio compiles them into its ColorTable, so load them before
+    #creating one
+    if not os.path.isdir(directory):
+        return
+    for fileName in sorted(os.listdir(directory)):
+        if fileName.endswith('.json'):
+            palette=Palette(os.path.join(directory,fileName))
+            colorMappers[os.path.splitext(fileName)[0]]=\
+                (palette.label,palette.findColor)
+
+class ColorTable:
+    #the colors of every color mode worked out once, for pitches 1/16 of a
+    #semitone apart from midinum 0 to 127, so finding the color of a pitch
+    #is an index into a table instead of trig every frame, and the colors
+    #of a whole recording are one gather. pitches outside 0-127 get the
+    #color at the nearest end
+    steps=16 #per semitone
+    maxMidi=127
+    def __init__(self,mappers,dress):
+        #mappers is a registry like colorMappers; dress is a function from
+        #an array of pitches to the 0-255 dress colors
+        self.midi=numpy.arange(self.maxMidi*self.steps+1)/self.steps
+        self.tables={}
+        for (mode,(label,findColor)) in mappers.items():
+            self.add(mode,findColor)
+        self.dress=numpy.clip(dress(self.midi),0,255).astype(numpy.uint8)
+        #hex names of the multicolor colors, for the label background
+        rgb=numpy.clip(255*self.tables['multicolor'],0,255).astype(int)
+        self.names=[rgbString(*color) for color in rgb.tolist()]
+
+    def add(self,mode,findColor):
+        rgb=numpy.broadcast_arrays(*findColor(self.midi))
+        self.tables[mode]=numpy.column_stack(rgb).astype(float)
+
+    def index(self,midi):
+        #row of the tables nearest to a pitch, or an array of rows for an
+        #array of pitches. no pitch (None or nan) is row 0
+        if numpy.ndim(midi)==0:
+            if midi is None or not midi>0:
+                return 0
+            return int(min(midi,self.maxMidi)*self.steps+0.5)
+        midi=numpy.nan_to_num(numpy.clip(midi,0,self.maxMidi))
+        return numpy.rint(midi*self.steps).astype(int)
+
+    def lookup(self,mode,midi):
+        return self.tables[mode][self.index(midi)]
+
+class Analysis:
+    #everything worked out from one window of samples. it is computed once
+    #per window and shared by the color mapping, the label and the bars
+    def __init__(self,midi,loudness,spectrum):
+        self.midi=midi #pitch in midinum
+        self.loudness=loudness #in dB
+        self.spectrum=spectrum #power of each fft bin
+        #as detected, before Audio's Smoother (if any) smoothed them
+        self.rawMidi=midi
+        self.rawLoudness=loudness
+        self.onset=False #whether a new note started in this window
+        #dress color (r,g,b), 0-255, and hex name of the multicolor color,
+        #filled in by Analyzer
+        self.color=None
+        self.colorName=None
+
+class OneEuroFilter:
+    #smooths a value that changes over time. slow changes are smoothed a
+    #lot (cutoff near minCutoff, in Hz) and fast ones hardly at all, as the
+    #cutoff rises by beta for every unit/sec the value is moving: jitter
+    #goes away without the value lagging behind real moves. Casiez et al,
+    #"1 euro filter", CHI 2012
+    def __init__(self,minCutoff,beta,derivativeCutoff=1.0):
+        self.minCutoff=minCutoff
+        self.beta=beta
+        self.derivativeCutoff=derivativeCutoff
+        self.reset()
+
+    def reset(self,x=None,t=None):
+        #forget the past, so the next value is taken as it is
+        self.x=x
+        self.dx=0.0
+        self.t=t
+
+    def alpha(self,cutoff,dt):
+        tau=1/(2*math.pi*cutoff)
+        return 1/(1+tau/dt)
+
+    def filter(self,x,t):
+        if self.x==None or self.t==None:
+            self.reset(x,t)
+            return x
+        dt=t-self.t
+        if dt<=0:
+            return self.x
+        self.t=t
+        dx=(x-self.x)/dt
+        self.dx+=self.alpha(self.derivativeCutoff,dt)*(dx-self.dx)
+        cutoff=self.minCutoff+self.beta*abs(self.dx)
+        self.x+=self.alpha(cutoff,dt)*(x-self.x)
+        return self.x
+
+class Smoother:
+    #sits between pitch detection and the color mapping so vibrato and
+    #noise do not make the lights flicker: pitch (in midinum) and loudness
+    #(in dB) go through one-euro filters. a new note must not fade in
+    #slowly though, so on an onset - a jump in spectral flux, the energy
+    #that appeared since the last window - the detected values pass
+    #straight through for settle windows, until the window holds only the
+    #new note, and smoothing starts again from there
+    def __init__(self,settle=2,pitchCutoff=1.0,pitchBeta=0.02,\
+                 loudnessCutoff=3.0,loudnessBeta=0.05,onsetRatio=1.8,\
+                 minFlux=0.1):
+        self.pitch=OneEuroFilter(pitchCutoff,pitchBeta)
+        self.loudness=OneEuroFilter(loudnessCutoff,loudnessBeta)
+        self.settle=settle
+        self.onsetRatio=onsetRatio #how far above the recent flux is an onset
+        self.minFlux=minFlux #never an onset below this, e.g. in noise
+        self.floor=40 #dB below the loudest band that count as silence
+        self.previous=None #levels of the bands in the last window
+        self.bandStarts=None #first fft bin of each band
+        self.bins=0
+        self.averageFlux=0.0
+        self.unsettled=0 #windows left before smoothing starts again
+
+    def bands(self,power):
+        #mean power in semitone-wide bands, so a note wandering by less
+        #than a semitone stays in the same band or the next
+        if self.bandStarts is None or self.bins!=len(power):
+            self.bins=len(power)
+            band=numpy.round(12*numpy.log2(numpy.arange(1,len(power))))
+            self.bandStarts=numpy.concatenate(([1],\
+                2+numpy.flatnonzero(numpy.diff(band))))
+            self.bandWidths=numpy.diff(numpy.append(self.bandStarts,\
+                                                    len(power)))
+        return numpy.add.reduceat(power,self.bandStarts)/self.bandWidths
+
+    def flux(self,power):
+        #positive spectral flux between this window and the last, as a
+        #fraction of this window's total so that it does not depend on the
+        #volume. each band counts by its level in dB above the floor, so
+        #one loud partial does not dominate and noise does not count, and
+        #is compared with the loudest of its neighbours last time, so
+        #vibrato is not mistaken for new notes (Boeck and Widmer,
+        #"Maximum filter vibrato suppression for onset detection", 2013)
+        power=self.bands(power)
+        with numpy.errstate(divide='ignore'):
+            level=10*numpy.log10(power/max(power.max(),1e-20))+self.floor
+        level=numpy.maximum(level,0)
+        previous=self.previous
+        self.previous=level
+        if previous is None or len(previous)!=len(level):
+            return 0.0
+        total=level.sum()
+        if total==0:
+            return 0.0
+        widened=previous.copy()
+        numpy.maximum(widened[1:],previous[:-1],out=widened[1:])
+        numpy.maximum(widened[:-1],previous[1:],out=widened[:-1])
+        return numpy.maximum(level-widened,0).sum()/total
+
+    def smooth(self,analysis,t):
+        #fills in analysis.midi and analysis.loudness with the smoothed
+        #values; the detected ones stay in rawMidi and rawLoudness
+        flux=self.flux(analysis.spectrum)
+        analysis.onset=flux>max(self.minFlux,self.onsetRatio*self.averageFlux)
+        self.averageFlux+=0.1*(flux-self.averageFlux)
+        if analysis.onset:
+            self.unsettled=self.settle
+        if self.unsettled>0:
+            self.unsettled-=1
+            self.pitch.reset()
+            self.loudness.reset()
+        if analysis.midi==None:
+            self.pitch.reset() #no pitch, so the next one starts afresh
+        else:
+            analysis.midi=self.pitch.filter(analysis.midi,t)
+        analysis.loudness=self.loudness.filter(analysis.loudness,t)
+        return analysis
+
 class Audio:
-    def __init__(self):
-        self.chunkSize=8192 #1 chunk is 8192 samples 
+    def __init__(self,detector='fft',windowSize=None,rate=44100,input=None,\
+                 hopSize=1024):
+        #detector is one of pitchDetectors. each picks its own window length
+        #unless windowSize is given: 'fft' needs 8192 samples to resolve
+        #low notes, 'yin' and 'hps' get by with 4096.
+        #input is where samples come from, the microphone unless given a
+        #ToneInput, WaveInput or other GeneratedInput.
+        #a new pitch comes every hopSize samples (1024 samples is ~43
+        #updates/sec), each from a window of windowSize samples that
+        #overlaps the previous ones. the sliding window, the smoother and
+        #the batch analysis are all built for this hop, so it can only be
+        #chosen here
+        self.detectorClass=pitchDetectors[detector]
+        if windowSize==None:
+            windowSize=self.detectorClass.windowSize
+        if not 0<hopSize<=windowSize:
+            raise ValueError('a hop of %d samples does not fit a window of %d'\
+                             %(hopSize,windowSize))
+        self.hopSize=hopSize
+        self.chunkSize=windowSize #1 chunk is 8192 samples for 'fft'
         #large chunk so that data is not
         #arriving faster than the computers' ability to read the data
-        self.format=pyaudio.paInt16 #have a size of 8, a 16 bit int
         self.channels=1
-        self.rate=44100 #44100 samples/sec
+        self.rate=rate #44100 samples/sec
         self.recordSec=0.1
         self.recording=False
         self.dtype=numpy.int16
         self.currentFreqInMidi=0
         #the frequency that's currently being detected (in midinum)
+        self.loudness=-80 #in dB, silence until the first window is analysed
+        self.analysis=None #the latest Analysis
         self.currentColor="white"
+        self.captureMode='callback' #'blocking' reads on the caller's thread
+        #the ring holds a few chunks so a slow reader still sees whole windows
+        self.audio=RingBuffer(4*self.chunkSize,self.dtype)
+        #samples have to arrive at least a hop at a time, or hops are skipped
+        if input==None:
+            input=AudioInput(self.channels,self.rate,\
+                             self.chunkSize,self.audio,self.captureMode)
+            input.framesPerBuffer=min(input.framesPerBuffer,self.hopSize)
+        else:
+            input.ring=self.audio
+            input.chunkSize=self.chunkSize
+            input.blockSize=min(input.blockSize,self.hopSize)
+            self.rate=input.rate
+        self.input=input
+        self.windowSize=self.chunkSize
+        self.slidingWindow=SlidingWindow(self.audio,self.windowSize,\
+                                         self.hopSize)
+        self.plan=SpectrumPlan(self.windowSize,self.rate)
+        self.detector=self.detectorClass(self.plan)
+        #None passes pitch and loudness straight from the detector to the
+        #color mapping
+        self.smoother=Smoother(settle=self.windowSize//self.hopSize)
+        #every color mode in colorMappers, so changing mode costs nothing
+        self.colors=ColorTable(colorMappers,findDressColor)
 
     def setUp(self):
         #processes sound chunk by chunk, much faster than sample by sample
@@ -34,14 +884,12 @@ class Audio:
         if self.chunks==0:
             self.chunks=1
         self.secPerSamples=1.0/self.rate
-        self.p=pyaudio.PyAudio()
-        self.stream=self.p.open(format=self.format,channels=self.channels,\
-                                rate=self.rate,input=True,\
-                                frames_per_buffer=self.chunkSize)
-        self.audio=numpy.empty(self.samples,dtype=self.dtype)
+        #opening the device is slow, so it only happens once per session
+        self.input.mode=self.captureMode
+        self.input.open()
 
     def close(self):
-        self.p.close(self.stream)
+        self.input.close()
 
     def fromFreqToMidi(self,freq):
         #Return midi note number from pitch
@@ -51,945 +899,638 @@ class Audio:
         #formula found on Wikipedia on "pitch"
         return 69 + 12 * math.log((freq / 440.0), 2.0)
 
-    #modified from code found on https://pypi.python.org/pypi/SoundAnalyse
     def getLoudness(self,chunk):
-        #return value is in dB
-        #loudness ranges from -80dB(no sound) to 0dB(maximum loudness)
-        #typical silence is -36dB
-        data = numpy.array(chunk, dtype=float) / 32768.0
-        ms = math.sqrt(numpy.sum(data ** 2.0) / len(data))
-        if ms < 10e-8:
-            ms = 10e-8
-        return 10.0 * math.log(ms, 10.0)
+        #return value is in dB, see SpectrumPlan.loudness
+        self.plan.load(chunk)
+        return self.plan.loudness()
 
     def getFrequency(self):
-        audioString=self.stream.read(self.chunkSize)
-        data=numpy.fromstring(audioString,dtype=self.dtype)
-        self.loudness=self.getLoudness(data)
-        # Take the fft and square each value
-        fftData=abs(numpy.fft.rfft(data))**2
-        # find the maximum
-        which = fftData[1:].argmax() + 1
-        # use quadratic interpolation around the max
-        if which != len(fftData)-1:
-            y0,y1,y2 = numpy.log(fftData[which-1:which+2:])
-            x1 = (y2 - y0) * .5 / (2 * y1 - y2 - y0)
-            # find the frequency and output it
-            freq = (which+x1)*self.rate/self.chunkSize
-        else:
-            freq = which*self.rate/self.chunkSize
-        return self.fromFreqToMidi(freq)
+        return self.analyze(self.input.read()).midi
+
+    def analyze(self,data,t=None):
+        #one pass over a window of samples: loudness, spectrum and pitch,
+        #smoothed by self.smoother. t is when the window ends, in seconds.
+        #the spectrum is the plan's buffer, so it is only valid until the
+        #next window is analysed
+        plan=self.plan
+        plan.load(data)
+        loudness=plan.loudness()
+        plan.transform()
+        freq=self.detector.detect()
+        self.analysis=Analysis(self.fromFreqToMidi(freq),loudness,plan.power)
+        if self.smoother!=None:
+            if t==None:
+                t=clock()
+            self.smoother.smooth(self.analysis,t)
+        self.currentFreqInMidi=self.analysis.midi
+        self.loudness=self.analysis.loudness
+        return self.analysis
+
+    def analyzeBatch(self,samples,batchSize=256):
+        #pitch (in midinum) and loudness of every hop of a whole recording.
+        #the windows are strided views into samples, so nothing is copied
+        #until each batch of batchSize windows goes through one batched fft
+        w,hop=self.windowSize,self.hopSize
+        n=max(0,(len(samples)-w)//hop+1)
+        step=samples.strides[0]
+        frames=as_strided(samples,shape=(n,w),strides=(hop*step,step))
+        midi=numpy.zeros(n)
+        loudness=numpy.zeros(n)
+        for start in range(0,n,batchSize):
+            batch=frames[start:start+batchSize]
+            end=start+len(batch)
+            loudness[start:end]=self.plan.loudnessBatch(batch)
+            if hasattr(self.detector,'detectBatch'):
+                freq=self.detector.detectBatch(batch)
+            else:
+                #engines without a batch version go one window at a time
+                freq=numpy.zeros(len(batch))
+                for i in range(len(batch)):
+                    self.plan.load(batch[i])
+                    freq[i]=self.detector.detect()
+            with numpy.errstate(divide='ignore'):
+                midi[start:end]=69+12*numpy.log2(freq/440.0)
+        return midi,loudness
 
     def record(self):
-        for i in range(self.chunks):
-            self.audio[i*self.chunkSize:(i+1)*self.chunkSize]=\
-                                                        self.getFrequency()
-            self.currentFreqInMidi=self.getFrequency()
+        #returns the new Analysis, or None if nothing new has arrived
+        if self.captureMode=='callback':
+            #only analyse once a new hop of samples has arrived
+            frame=self.slidingWindow.next()
+            if frame is None:
+                return None
+            #time by the samples, so smoothing is the same however late
+            #the window is analysed
+            return self.analyze(frame,self.slidingWindow.position/self.rate)
+        return self.analyze(self.input.read())
 
     def stopRecording(self):
-        if self.recording==True:
-            self.recording=False
-            self.p.terminate()
-            self.close()
+        self.recording=False
+        self.close()
 
     def startRecording(self):
-        self.setUp()     
-        self.record()
-
-    def findRed(self):
-        #the lower the frequency, the more red 
-        maxMidi=127
-        h=maxMidi/(math.pi/2-50/127*math.pi/2)
-        if self.currentFreqInMidi<50:
-            return 1
-        elif self.currentFreqInMidi>100:
-            return 0
-        else:
-            midiFreq=self.currentFreqInMidi
-        return math.cos(midiFreq/h)
-
-    def findBlue(self):
-        #the higher the frequency, the more blue
-        maxMidi=127
-        return 2**(self.currentFreqInMidi/maxMidi)-1
-
-    def findGreen(self):
-        #midium frequency has the most green
-        maxMidi=127
-        h=maxMidi/(math.pi-50/127*math.pi)
-        if self.currentFreqInMidi<50:
-            return 0
-        return abs(math.sin(self.currentFreqInMidi/h+50/127*math.pi))
+        if not self.input.isOpen():
+            self.setUp()
+        return self.record()
 
     def findRGB(self):
-        maxRgbCode=255
-        red=int(maxRgbCode*self.findRed())
-        green=int(maxRgbCode*self.findGreen())
-        blue=int(maxRgbCode*self.findBlue())
-        self.currentColor=rgbString(red,green,blue)
-        if red==max(red,green,blue):
-            (red,green,blue)=(red,int(green*0.2),int(blue*0.2))
-            #red is very hard to show so whenever red dominates
-            #we want it to dominate more
-        self.r=red
-        self.g=green
-        self.b=blue
-
-    def findRedIfRedOnly(self):
-        #the higher the frequency, the more red 
-        maxMidi=127
-        h=maxMidi/(math.pi/2)
-        rgbCode=math.sin(self.currentFreqInMidi/h)
-        return (rgbCode,0,0)
-
-    def findYellow(self):
-        #the higher the frequency, the more yellow
-        maxMidi=127
-        h=maxMidi/(math.pi/2)
-        rgbCode=math.sin(self.currentFreqInMidi/h)
-        return (rgbCode,rgbCode,0)
-
-    def findGreenIfGreenOnly(self):
-        #the higher the frequency, the more green
-        maxMidi=127
-        h=maxMidi/(math.pi/2)
-        rgbCode=math.sin(self.currentFreqInMidi/h)
-        return (0,rgbCode,0)
-
-    def findPurple(self):
-        #the higher the frequency, the more purple
-        maxMidi=127
-        h=maxMidi/(math.pi/2)
-        rgbCode=math.sin(self.currentFreqInMidi/h)
-        return (rgbCode,0,rgbCode)
-
-    def findBlueIfBlueOnly(self):
-        #the higher the frequency, the more blue
-        maxMidi=127
-        h=maxMidi/(math.pi/2)
-        rgbCode=math.sin(self.currentFreqInMidi/h)
-        return (0,0,rgbCode)       
-
-class Model:
-    def __init__(self,rgbColor):
-        self.skinColor=(0.93,0.80,0.68)
-        self.red=rgbColor[0]
-        self.green=rgbColor[1]
-        self.blue=rgbColor[2]
-        self.axis=(0,0.7,0)
-        self.frame=frame()
-        self.dressPattern='waterfall'
-
-    def findRGBTuple(self):
-        self.rgbColor=(self.red,self.green,self.blue)
-
-    def drawTrunk(self):
-        f=self.frame
-        cylinder(frame=f,pos=(0,-0.3,0),axis=self.axis,radius=0.05,length=1,\
-                 color=self.skinColor)
-
-    def drawHead(self):
-        f=self.frame
-        sphere(frame=f,pos=(0,0.7,0),radius=0.2,color=self.skinColor)
-
-    def drawLimbs(self):
-        f=self.frame
-        #arm 1
-        curve(frame=f,pos=[(-0.1,0.35,0), (-0.4,0.2,0), (-0.1,0.05,0)],\
-              radius=0.05,color=self.skinColor)
-        #elbow1
-        sphere(frame=f,pos=(-0.4,0.2,0),radius=0.047,color=self.skinColor)
-        #arm 2
-        curve(frame=f,pos=[(0.1,0.35,0), (0.4,0.2,0),(0.1,0.05,0)],\
-              radius=0.05,color=self.skinColor)
-        #elbow2
-        sphere(frame=f,pos=(0.4,0.2,0),radius=0.047,color=self.skinColor)
-        #thigh 1
-        curve(frame=f,pos=[(-0.1,-0.3,0),(-0.06,-0.8,0)],radius=0.07,\
-              color=self.skinColor)
-        #knee 1
-        sphere(frame=f,pos=(-0.06,-0.83,0), radius=0.069, \
-               color=self.skinColor)
-        #calf 1
-        ellipsoid(frame=f,pos=(-0.06,-1,0), length=0.11, height=0.6, \
-                  width=0.13,color=self.skinColor)
-        #foot 1
-        ellipsoid(frame=f,pos=(-0.06,-1.27,0.08),length=0.1,height=0.07,\
-                  width=0.23,color=color.white)
-        #thigh 2
-        curve(frame=f,pos=[(0.1,-0.3,0),(0.094,-0.8,0)],radius=0.07,\
-              color=self.skinColor)
-        #knee 2
-        sphere(frame=f,pos=(0.094,-0.83,0), radius=0.069, \
-               color=self.skinColor)
-        #calf 2
-        ellipsoid(frame=f,pos=(0.094,-1,0), length=0.11, height=0.6,\
-                  width=0.13,color=self.skinColor)
-        #foot 2
-        ellipsoid(frame=f,pos=(0.094,-1.27,0.08),length=0.1,height=0.07,\
-                  width=0.23,color=color.white)
-
-    def drawDress(self):
-        #the white template
-        f=self.frame
-        ring(frame=f,pos=(0,0.38,0),axis=(0,0.4,0),radius=0.06, thickness=0.05)
-        ring(frame=f,pos=(0,0.34,0),axis=(0,0.4,0), radius=0.1, thickness=0.05)
-        ring(frame=f,pos=(0,0.28,0),axis=(0,0.4,0), radius=0.13, thickness=0.05)
-        ring(frame=f,pos=(0,0.22,0),axis=(0,0.4,0), radius=0.13, thickness=0.05)
-        ring(frame=f,pos=(0,0.16,0),axis=(0,0.4,0), radius=0.12, thickness=0.05)
-        ring(frame=f,pos=(0,0.1,0), axis=(0,0.4,0), radius=0.11, thickness=0.05)
-        ring(frame=f,pos=(0,0.04,0), axis=(0,0.4,0), radius=0.10,thickness=0.05)
-        ring(frame=f,pos=(0,-0.02,0),axis=(0,0.4,0), radius=0.10,thickness=0.05)
-        ring(frame=f,pos=(0,-0.08,0), axis=(0,0.4,0),radius=0.12,thickness=0.05)
-        ring(frame=f,pos=(0,-0.14,0),axis=(0,0.4,0), radius=0.14,thickness=0.05)
-        ring(frame=f,pos=(0,-0.2,0),axis=(0,0.4,0), radius=0.16, thickness=0.05)
-        ring(frame=f,pos=(0,-0.26,0),axis=(0,0.4,0), radius=0.17,thickness=0.05)
-        ring(frame=f,pos=(0,-0.32,0),axis=(0,0.4,0), radius=0.18,thickness=0.05)
-        ring(frame=f,pos=(0,-0.38,0),axis=(0,0.4,0), radius=0.18,thickness=0.05)
-        ring(frame=f,pos=(0,-0.44,0),axis=(0,0.4,0), radius=0.17,thickness=0.05)
-
-    def drawLabels(self):
-        self.title=label(pos=self.axis,color=(1,1,1),\
-                         text='Musical Dress Display',\
-                            box=False,line=False,opacity=0,xoffset=0,\
-                            yoffset=60)
-
-    def drawTopLEDSpiral(self):
-        f=self.frame
-        self.spiral1=ring(frame=f,pos=(0,0.4,0),axis=(0,0.4,0),radius=0.11, \
-                          thickness=0.01,color=self.rgbColor)
-        self.spiral2=ring(frame=f,pos=(0,0.37,0),axis=(0,0.4,0),radius=0.14, \
-                          thickness=0.01,color=self.rgbColor)
-        self.spiral3=ring(frame=f,pos=(0,0.34,0),axis=(0,0.4,0), radius=0.15, \
-                          thickness=0.01,color=self.rgbColor)
-        self.spiral4=ring(frame=f,pos=(0,0.31,0),axis=(0,0.4,0),radius=0.17, \
-                          thickness=0.01,color=self.rgbColor)
-        self.spiral5=ring(frame=f,pos=(0,0.28,0),axis=(0,0.4,0), radius=0.18, \
-                          thickness=0.01,color=self.rgbColor)
-        self.spiral6=ring(frame=f,pos=(0,0.25,0),axis=(0,0.4,0),radius=0.18, \
-                          thickness=0.01,color=self.rgbColor)
-        self.spiral7=ring(frame=f,pos=(0,0.22,0),axis=(0,0.4,0), radius=0.18, \
-                          thickness=0.01,color=self.rgbColor)
-        self.spiral8=ring(frame=f,pos=(0,0.19,0),axis=(0,0.4,0),radius=0.17, \
-                          thickness=0.01,color=self.rgbColor)
-        self.spiral9=ring(frame=f,pos=(0,0.16,0),axis=(0,0.4,0), radius=0.17, \
-                          thickness=0.01,color=self.rgbColor)
-        self.spiral10=ring(frame=f,pos=(0,0.13,0),axis=(0,0.4,0),radius=0.17, \
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral11=ring(frame=f,pos=(0,0.1,0), axis=(0,0.4,0), radius=0.16, \
-                           thickness=0.01,color=self.rgbColor)
-
-    def drawWaistLEDSpiral(self):
-        f=self.frame
-        self.spiral12=ring(frame=f,pos=(0,0.07,0),axis=(0,0.4,0),radius=0.16,\
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral13=ring(frame=f,pos=(0,0.04,0), axis=(0,0.4,0),radius=0.16,\
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral14=ring(frame=f,pos=(0,0.01,0),axis=(0,0.4,0),radius=0.16, \
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral15=ring(frame=f,pos=(0,-0.02,0),axis=(0,0.4,0), radius=0.16,\
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral16=ring(frame=f,pos=(0,-0.05,0),axis=(0,0.4,0),radius=0.17,\
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral17=ring(frame=f,pos=(0,-0.08,0), axis=(0,0.4,0),radius=0.18,\
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral18=ring(frame=f,pos=(0,-0.11,0),axis=(0,0.4,0),radius=0.19, \
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral19=ring(frame=f,pos=(0,-0.14,0),axis=(0,0.4,0), radius=0.19,\
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral20=ring(frame=f,pos=(0,-0.11,0),axis=(0,0.4,0),radius=0.19, \
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral21=ring(frame=f,pos=(0,-0.14,0),axis=(0,0.4,0), radius=0.2,\
-                           thickness=0.01,color=self.rgbColor)
-
-    def drawBottomLEDSpiral(self):
-        f=self.frame
-        self.spiral22=ring(frame=f,pos=(0,-0.17,0),axis=(0,0.4,0),radius=0.21, \
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral23=ring(frame=f,pos=(0,-0.2,0),axis=(0,0.4,0), radius=0.22,\
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral24=ring(frame=f,pos=(0,-0.23,0),axis=(0,0.4,0),radius=0.22, \
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral25=ring(frame=f,pos=(0,-0.26,0),axis=(0,0.4,0), radius=0.225,\
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral26=ring(frame=f,pos=(0,-0.29,0),axis=(0,0.4,0),radius=0.23, \
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral27=ring(frame=f,pos=(0,-0.32,0),axis=(0,0.4,0), radius=0.23,\
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral28=ring(frame=f,pos=(0,-0.35,0),axis=(0,0.4,0),radius=0.23, \
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral29=ring(frame=f,pos=(0,-0.38,0),axis=(0,0.4,0), radius=0.228,\
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral30=ring(frame=f,pos=(0,-0.41,0),axis=(0,0.4,0),radius=0.228,\
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral31=ring(frame=f,pos=(0,-0.44,0),axis=(0,0.4,0), radius=0.224,\
-                           thickness=0.01,color=self.rgbColor)
-        self.spiral32=ring(frame=f,pos=(0,-0.47,0),axis=(0,0.4,0),radius=0.22, \
-                           thickness=0.01,color=self.rgbColor)
-
-    def gatherLEDSpirals(self):
-        self.LEDSpirals=[self.spiral1,self.spiral2,self.spiral3,self.spiral4,\
-                         self.spiral5,self.spiral6,self.spiral7,self.spiral8,\
-                         self.spiral9,self.spiral10,self.spiral11,self.spiral12,\
-                         self.spiral13,self.spiral14,self.spiral15,\
-                         self.spiral16,self.spiral17,self.spiral18,\
-                         self.spiral19,self.spiral20,self.spiral21,\
-                         self.spiral22,self.spiral23,self.spiral24,\
-                         self.spiral25,self.spiral26,self.spiral27,\
-                         self.spiral28,self.spiral29,self.spiral30,\
-                         self.spiral31,self.spiral32]
-
-    def drawLEDSpirals(self):
-        #when lightup mode is 'waterfall'
-        self.findRGBTuple()
-        self.drawTopLEDSpiral()
-        self.drawWaistLEDSpiral()
-        self.drawBottomLEDSpiral()
-        self.gatherLEDSpirals()
-
-    def drawLEDPoints1(self):
-        f=self.frame
-        self.points1=points(frame=f,\
-                           pos=[(-0.1,0.35,0.115),(0.1,0.35,0.115),\
-                                (0.1,0.35,-0.115),(-0.1,0.35,-0.115)],\
-                           color=self.rgbColor)
-        self.points2=points(frame=f,\
-                            pos=[(-0.165,0.3,0.055),(-0.1,0.3,0.15),\
-                                 (0.1,0.3,0.15),(0.165,0.3,0.055),\
-                                 (0.165,0.3,-0.055),(0.1,0.3,-0.15),\
-                                 (-0.1,0.3,-0.15),(-0.165,0.3,-0.055)],\
-                            color=self.rgbColor)
-        self.points3=points(frame=f,\
-                            pos=[(-0.18,0.25,0),(-0.17,0.25,0.065),\
-                                 (-0.1,0.25,0.15),(0,0.25,0.185),\
-                                 (0.1,0.25,0.15),(0.17,0.25,0.065),\
-                                 (0.18,0.25,0),(0.17,0.25,-0.065),\
-                                 (0.1,0.25,-0.15),(0,0.25,-0.185),\
-                                 (-0.1,0.25,-0.15),(-0.17,0.25,-0.065)],\
-                            color=self.rgbColor)
-
-    def drawLEDPoints2(self):
-        f=self.frame
-        self.points4=points(frame=f,\
-                            pos=[(-0.18,0.2,0),(-0.17,0.2,0.065),\
-                                 (-0.1,0.2,0.15),(0,0.2,0.185),\
-                                 (0.1,0.2,0.15),(0.17,0.2,0.065),\
-                                 (0.18,0.2,0),(0.17,0.2,-0.065),\
-                                 (0.1,0.2,-0.15),(0,0.2,-0.185),\
-                                 (-0.1,0.2,-0.15),(-0.17,0.2,-0.065)],\
-                            color=self.rgbColor)
-        self.points5=points(frame=f,\
-                            pos=[(-0.16,0.15,0.078),(-0.1,0.15,0.14),\
-                                 (0,0.15,0.172),(0.1,0.15,0.14),\
-                                 (0.16,0.15,0.078),(0.16,0.15,-0.078),\
-                                 (0.1,0.15,-0.14),(0,0.15,-0.172),\
-                                 (-0.1,0.15,-0.14),(-0.16,0.15,-0.078)],\
-                            color=self.rgbColor)
-        self.points6=points(frame=f,\
-                            pos=[(-0.15,0.1,0.062),(-0.1,0.1,0.13),\
-                                 (0,0.1,0.165),(0.1,0.1,0.13),\
-                                 (0.15,0.1,0.062),(0.15,0.1,-0.062),\
-                                 (0.1,0.1,-0.13),(0,0.1,-0.165),\
-                                 (-0.1,0.1,-0.13),(-0.15,0.1,-0.062)],\
-                            color=self.rgbColor)
-
-    def drawLEDPoints3(self):
-        f=self.frame
-        self.points7=points(frame=f,\
-                            pos=[(-0.14,0.05,0.07),(-0.1,0.05,0.11),\
-                                 (-0.05,0.05,0.145),(0,0.05,0.15),\
-                                 (0.05,0.05,0.145),(0.1,0.05,0.11),\
-                                 (0.14,0.05,0.07),(0.14,0,-0.07),\
-                                 (0.1,0.05,-0.11),(0.05,0.05,-0.14),\
-                                 (0,0.05,-0.15),(-0.05,0.05,-0.14),\
-                                 (-0.1,0.05,-0.11),(-0.14,0.05,-0.07)],\
-                            color=self.rgbColor)
-        self.points8=points(frame=f,\
-                            pos=[(-0.15,0,0),(-0.14,0,0.07),(-0.1,0,0.11),\
-                                 (-0.05,0,0.14),(0,0,0.14),(0.05,0,0.14),\
-                                 (0.1,0,0.11),(0.14,0,0.07),(0.15,0,0),\
-                                 (0.14,0,-0.07),(0.1,0,-0.11),(0.05,0,-0.14),\
-                                 (0,0,-0.14),(-0.05,0,-0.14),(-0.1,0,-0.11),\
-                                 (-0.14,0,-0.07)],\
-                            color=self.rgbColor)
-        self.points9=points(frame=f,\
-                            pos=[(-0.15,-0.05,0.062),(-0.1,-0.05,0.13),\
-                                 (0,-0.05,0.16),(0.1,-0.05,0.13),\
-                                 (0.15,-0.05,0.062),(0.15,-0.05,-0.062),\
-                                 (0.1,-0.05,-0.13),(0,-0.05,-0.16),\
-                                 (-0.1,-0.05,-0.13),(-0.15,-0.05,-0.062)],\
-                            color=self.rgbColor)
-
-    def drawLEDPoints4(self):
-        f=self.frame
-        self.points10=points(frame=f,\
-                             pos=[(-0.173,-0.08,0),(-0.14,-0.08,0.1),\
-                                  (-0.06,-0.08,0.165),(0.06,-0.08,0.165),\
-                                  (0.14,-0.08,0.1),(0.173,-0.08,0),\
-                                  (0.14,-0.08,-0.1),(0.06,-0.08,-0.165),\
-                                  (-0.06,-0.08,-0.165),(-0.14,-0.08,-0.1)],\
-                             color=self.rgbColor)
-        self.points11=points(frame=f,\
-                             pos=[(-0.17,-0.12,0.065),(-0.12,-0.12,0.15),\
-                                  (0,-0.12,0.19),(0.12,-0.12,0.15),\
-                                  (0.17,-0.12,0.065),(0.17,-0.12,-0.065),\
-                                  (0.12,-0.12,-0.15),(0,-0.12,-0.19),\
-                                  (-0.12,-0.12,-0.15),(-0.17,-0.12,-0.065)],\
-                             color=self.rgbColor)
-        self.points12=points(frame=f,\
-                             pos=[(-0.195,-0.15,0),(-0.16,-0.15,0.115),\
-                                  (-0.07,-0.15,0.19),(0.07,-0.15,0.19),\
-                                  (0.16,-0.15,0.115),(0.195,-0.15,0),\
-                                  (0.16,-0.15,-0.115),(0.07,-0.15,-0.19),\
-                                  (-0.07,-0.15,-0.19),(-0.16,-0.15,-0.115)],\
-                             color=self.rgbColor)
-
-    def drawLEDPoints5(self):
-        f=self.frame
-        self.points13=points(frame=f,\
-                             pos=[(-0.19,-0.18,0.07),(-0.13,-0.18,0.16),\
-                                  (0,-0.18,0.21),(0.13,-0.18,0.16),\
-                                  (0.19,-0.18,0.07),(0.19,-0.18,-0.07),\
-                                  (0.13,-0.18,-0.16),(0,-0.18,-0.21),\
-                                  (-0.13,-0.18,-0.16),(-0.19,-0.18,-0.07)],\
-                             color=self.rgbColor)
-        self.points14=points(frame=f,\
-                             pos=[(-0.21,-0.21,0),(-0.18,-0.21,0.125),\
-                                  (-0.075,-0.21,0.2),(0.075,-0.21,0.2),\
-                                  (0.18,-0.21,0.125),(0.21,-0.21,0),\
-                                  (0.18,-0.21,-0.125),(0.075,-0.21,-0.2),\
-                                  (-0.075,-0.21,-0.2),(-.18,-0.21,-0.125)],\
-                             color=self.rgbColor)
-        self.points15=points(frame=f,\
-                             pos=[(-0.205,-0.24,0.07),(-0.14,-0.24,0.18),\
-                                  (0,-0.24,0.22),(0.14,-0.24,0.18),\
-                                  (0.205,-0.24,0.07),(0.205,-0.24,-0.07),\
-                                  (0.14,-0.24,-0.18),(0,-0.24,-0.22),\
-                                  (-.14,-0.24,-0.18),(-0.205,-0.24,-0.07)],\
-                             color=self.rgbColor)
-
-    def drawLEDPoints6(self):
-        f=self.frame
-        self.points16=points(frame=f,\
-                             pos=[(-0.205,-0.29,0.075),(-0.145,-0.29,0.18),\
-                                  (0,-0.29,0.22),(0.145,-0.29,0.18),\
-                                  (0.205,-0.29,0.075),(0.205,-0.29,-0.075),\
-                                  (0.145,-0.29,-0.18),(0,-0.29,-0.22),\
-                                  (-.145,-0.29,-0.18),(-.205,-.29,-0.075)],\
-                             color=self.rgbColor)
-
-    def gatherLEDPoints(self):
-        self.LEDPoints=[self.points1,self.points2,self.points3,\
-                        self.points4,self.points5,self.points6,\
-                        self.points7,self.points8,self.points9,\
-                        self.points10,self.points11,self.points12,\
-                        self.points13,self.points14,self.points15,\
-                        self.points16]
-
-    def drawLEDPoints(self):
-        #when lightup mode is 'fireworks'
-        self.findRGBTuple()
-        self.drawLEDPoints1()
-        self.drawLEDPoints2()
-        self.drawLEDPoints3()
-        self.drawLEDPoints4()
-        self.drawLEDPoints5()
-        self.drawLEDPoints6()
-        self.gatherLEDPoints()
-
-    def draw(self):
-        self.drawTrunk()
-        self.drawDress()
-        self.drawHead()
-        self.drawLimbs()
-        self.drawLabels()
-        self.drawLEDSpirals()
-        self.drawLEDPoints()
-        for point in self.LEDPoints:
-            point.visible=False
-
-
-class Bars:
-    def __init__(self,rgbColor,loudness):
-        self.red=rgbColor[0]
-        self.green=rgbColor[1]
-        self.blue=rgbColor[2]
-        self.frame=frame()
-        self.axis=(0,1,0)
-        self.loudness=loudness
-        self.rgbSum=self.red+self.green+self.blue
-
-    def drawRedBar(self):
-        self.redBar=cylinder(frame=self.frame,pos=(-1,-2,0),\
-                             axis=(0,self.red*10,0),\
-                 radius=1,color=color.red,length=self.red*10,\
-                             opacity=self.loudness)
-
-    def drawGreenBar(self):
-        self.greenBar=cylinder(frame=self.frame,pos=(1,-2,0),\
-                               axis=(0,self.green*10,0),\
-                 radius=1,color=color.green,length=self.green*10,\
-                               opacity=self.loudness)
-
-    def drawBlueBar(self):
-        self.blueBar=cylinder(frame=self.frame,pos=(0,-2,-(3**0.5)),\
-                              axis=(0,self.blue*10,0),\
-                 radius=1,color=color.blue,length=self.blue*10,\
-                              opacity=self.loudness)
-        
-    def drawLabels(self):
-        self.redLabel=label(pos=self.axis,color=(1,1,1),text='% of red',\
-                            box=False,line=False,opacity=0,xoffset=-60,\
-                            yoffset=-60)
-        self.redness=label(pos=self.axis,color=(1,1,1),\
-                           text='%0.2f'%(self.red/self.rgbSum*100)+'%',\
-                            box=False,line=False,opacity=0,xoffset=20,\
-                            yoffset=-60)
-        self.blueLabel=label(pos=self.axis,color=(1,1,1),text='% of blue',\
-                             box=False,line=False,opcaity=0,xoffset=-58,\
-                             yoffset=-80)
-        self.blueness=label(pos=self.axis,color=(1,1,1),\
-                            text='%0.2f'%(self.green/self.rgbSum*100)+'%',\
-                             box=False,line=False,opcaity=0,xoffset=20,\
-                             yoffset=-80)
-        self.greenLabel=label(pos=self.axis,color=(1,1,1),text='% of green',\
-                              box=False,line=False,opacity=0,xoffset=-53,\
-                              yoffset=-100)
-        self.greenness=label(pos=self.axis,color=(1,1,1),\
-                             text='%0.2f'%(self.blue/self.rgbSum*100)+'%',\
-                              box=False,line=False,opacity=0,xoffset=20,\
-                              yoffset=-100)
-
-    def draw(self):
-        self.drawRedBar()
-        self.drawGreenBar()
-        self.drawBlueBar()
-        self.drawLabels()
-
-class Window:
-    def __init__(self,data):
-        self.w=data.w
-        self.L=data.L #half the length of the window
-        self.margin=data.margin
-        self.p=self.w.panel
-        #the full region of the window in which to place widgets
-        self.p.SetBackgroundColour('#000000') #black
-
-    def staticTexts1(self):
-        self.frequencyDetectorText=wx.StaticText(self.p,\
-                      pos=(1.6*self.L,self.L*0.4),\
-                      label="Frequency Detector")
-        self.frequencyDetectorText.SetFont(wx.Font(22,wx.SCRIPT,wx.NORMAL,\
-                                                   wx.BOLD))
-        self.frequencyDetectorText.SetForegroundColour((255,255,255))
-        self.barsText=wx.StaticText(self.p,\
-                                    pos=(1.5*(self.L+self.margin*2),\
-                                         self.L-self.margin*3),\
-                                    label="Red,Green,Blue Distribution")
-        self.barsText.SetForegroundColour((255,255,255))
-        self.detectFreqText=wx.StaticText(self.p,\
-                            pos=(self.L,self.margin*5),\
-                            label="Detect Sound Frequency")
-        self.detectFreqText.SetForegroundColour((255,255,255))
-        self.detectFreqText.SetFont(wx.Font(16,wx.SCRIPT,wx.NORMAL,\
-                                                   wx.BOLD))
-    def staticTexts2(self):
-        self.dressPatternText=wx.StaticText(self.p,\
-                                        pos=(self.margin*2.5,self.margin),\
-                                        label='Choose a Dress Pattern')
-        self.dressPatternText.SetForegroundColour((255,255,255))
-        self.colorModeText=wx.StaticText(self.p,\
-                                pos=(self.L+self.margin/5,self.margin),\
-                                label='Choose a Color Mode ')
-        self.colorModeText.SetForegroundColour((255,255,255))
-        self.modeText=wx.StaticText(self.p,\
-                                    pos=(self.L*1.8,self.margin),\
-                                    label="Choose a Light-up Mode")
-        self.modeText.SetForegroundColour((255,255,255))
-        self.dressText=wx.StaticText(self.p,\
-                                     pos=(self.L*1.63,self.L*1.74),\
-                                     label='Choose a Light-up Mode')
-        self.dressText.SetForegroundColour((255,255,255))
-
-    def staticTexts(self):
-        self.staticTexts1()
-        self.staticTexts2()
-        
-    def freqText(self,data):
-        self.fText=wx.StaticText(self.p,pos=\
-                                (1.54*self.L,self.L*0.5)\
-                                 ,label='')
-        self.fText.SetFont(wx.Font(74, wx.MODERN,wx.NORMAL,wx.BOLD))
-
-    def displayCheckBox(self):
-        self.checkBox=wx.CheckBox(self.p,label="",\
-                                  pos=(self.L-self.margin*1.5,self.margin*5))
-
-    def displayComboBox(self):
-        choices=['Select Color Mode','Red Only Mode','Yellow Only Mode',\
-                 'Green Only Mode','Purple Only Mode','Blue Only Mode',\
-                 'Multicolor Mode']
-        self.comboBox=wx.ComboBox(self.p,choices=choices,pos=\
-                                  (self.L-self.margin/2,self.margin*2.2))
-
-    def displayRadioBox(self):
-        choices1=['Waterfall Pattern','Fireworks Pattern']
-        self.radioBox1=wx.RadioBox(self.p,choices=choices1,\
-                                  pos=(self.margin,self.margin*2),
-                                  style=wx.RA_SPECIFY_ROWS,\
-                                  size=(self.L/1.5,self.L/4.5))
-        self.radioBox1.SetBackgroundColour((255,255,255))
-        choices2=['Dropping Mode','Expanding Mode']
-        self.radioBox2=wx.RadioBox(self.p,choices=choices2,\
-                                   pos=(self.L*1.7,self.margin*2),\
-                                   style=wx.RA_SPECIFY_ROWS,\
-                                   size=(self.L/1.5,self.L/4.5))
-        self.radioBox2.SetBackgroundColour((255,255,255))
-        choices3=['Demo Mode','Current Mode']
-        self.radioBox3=wx.RadioBox(self.p,choices=choices3,\
-                                   pos=(self.L*1.6,self.L*1.8),\
-                                   style=wx.RA_SPECIFY_ROWS,\
-                                   size=(self.L/2,self.L/5))
-        self.radioBox3.SetBackgroundColour((255,255,255))
-
-    def displayShowDressButton(self):
-        self.showDressButton=wx.Button(self.p,pos=(self.L*2.18,self.L*1.85),\
-                                  label="Light Up!")
-        
-    def display(self,data):
-        self.displayCheckBox()
-        self.displayComboBox()
-        self.displayRadioBox()
-        self.displayShowDressButton()
-        self.staticTexts()
-        self.freqText(data)
-
-def initArduino(data):
-    #set up pins
-    data.pinDict={'row1':([2],[3],[4]),'row2':([5],[6],[7]),'row3':([8],[10],[9]),\
-       'row4':([11],[12],[14]),'row5':([15],[16],[17]),\
-       'row6':([18,21],[19,22],[20,23]),'row7':([24,27],[25,28],[26,29]),\
-       'row8':([30],[31],[32]),'row9':([33],[34],[35]),\
-       'row10':([36],[37],[38]),'row11':([39],[40],[41]),\
-       'row12':([42],[43],[44]),'row13':([45],[46],[47]),\
-       'row14':([48],[49],[50])}
-    data.ser=serial.Serial('/dev/cu.usbmodem1411',9600)
-    time.sleep(2) #wait for everything to initialize
-
-def initData(data):
-    data.L=320
-    data.margin=20
-    data.sound=Audio()
-    #anything below -50db is definitely silence
-    #data.loudness: a scale of loudness from 0(no sound) to 1(maximum sound)
-    #begin with 0.375, which is silence
-    data.loudness=0.375
-    data.loudnessInterval=9
-    data.detectedFreqList=[]
-    data.colorModeSelected=False
-    data.colorMode=None
-    data.mode='dropping'
-    data.rgbColor=(1,1,1)
-    data.dressShow=False
-    data.dressMode='demo'
-    data.i=0
-    data.dress=Dress()
-
-def initWindow(data):
-    initData(data)
-    data.w=window(width=2.5*(data.L+window.dwidth),\
-                  height=2*(data.L+window.dheight+window.menuheight),\
-                  menus=True,title='Musical Garment',\
-                  style=wx.SYSTEM_MENU | wx.CAPTION | wx.CLOSE_BOX|\
-                  wx.FRAME_EX_METAL)
-    data.screen1=display(window=data.w,x=0,y=data.margin*6,\
-                         width=data.L*1.5,height=data.L*1.6,\
-                         forward=-vector(0,0,4))
-    data.screen2=display(window=data.w,x=1.6*data.L,\
-                         y=data.L*0.9,\
-                         width=data.L-4*data.margin,\
-                         height=data.L-4*data.margin,\
-                         forward=-vector(0,0.15,-0.1))
-    data.window=Window(data)
-    data.window.display(data) #all the widgets
-    data.screen1.select()
-    data.model=Model(data.rgbColor)
-    data.model.draw()
-    data.screen2.select()
-    data.bars=Bars(data.rgbColor,data.loudness)
-    #loudness determines the bars' opacity
-    data.bars.draw()
-
-def calculateLoudness(data):
-    #typical loundness ranges from -80dB to 0dB
-    #make the loudness value positive by adding 80
-    #now the higher the value, the louder
-    positiveLoudness=data.sound.loudness+80
-    silence=30
-    maxLoudness=80
-    data.loudness=positiveLoudness/80
-    #determine qualitatively how loud a sound is
-    #the louder, the smaller the loudness level
-    if positiveLoudness<=silence:
-        loudnessLevel=5
-    elif silence<positiveLoudness<=\
-         silence+2*data.loudnessInterval:
-        loudnessLevel=3
-    else:
-        loudnessLevel=1
-    return loudnessLevel
-
-def mousePressed(data):
-    def toggleAudio(evt):
-        choice=data.window.checkBox.GetValue()
-        if choice==False:
-            data.sound.stopRecording()
-        else:
-            data.sound.recording=True
-
-    def selectDressPattern(evt):
-        choice=data.window.radioBox1.GetSelection()
-        if choice==0:
-            data.detectedFreqList=[] #turn the dress white
-            if data.model.dressPattern=='fireworks':
-                for point in data.model.LEDPoints:
-                    point.visible=False
-            data.model.dressPattern='waterfall'
-            for spiral in data.model.LEDSpirals:
-                spiral.visible=True
-        else:
-            data.detectedFreqList=[] #turn the dress white
-            if data.model.dressPattern=='waterfall':
-                for spiral in data.model.LEDSpirals:
-                    spiral.visible=False 
-            data.model.dressPattern='fireworks'
-            for point in data.model.LEDPoints:
-                point.visible=True
-
-    def selectMode(evt):
-        choice=data.window.radioBox2.GetSelection()
-        if choice==0:
-            data.detectedFreqList=[]
-            data.mode='dropping'
-        if choice==1:
-            data.detectedFreqList=[]
-            data.mode='expanding'
-
-    def selectColorMode(evt):
-        choice=data.window.comboBox.GetSelection()
-        if choice==0:
-            data.colorModeSelected=False
-        else:
-            data.colorModeSelected=True
-            if choice==1:
-                data.colorMode='red'
-            elif choice==2:
-                data.colorMode='yellow'
-            elif choice==3:
-                data.colorMode='green'
-            elif choice==4:
-                data.colorMode='purple'
-            elif choice==5:
-                data.colorMode='blue'
-            elif choice==6:
-                data.colorMode='multicolor'
-
-    def selectDressMode(evt):
-        choice=data.window.radioBox3.GetSelection()
-        if choice==0:
-            data.dressMode='demo'
-        else:
-            data.dressMode=data.mode
-
-    def lightUp(evt):
-        data.w.visible=False #hide the main window
-        runDress(data)
-
-    data.window.checkBox.Bind(wx.EVT_CHECKBOX, toggleAudio)
-    data.window.radioBox1.Bind(wx.EVT_RADIOBOX,selectDressPattern)
-    data.window.radioBox2.Bind(wx.EVT_RADIOBOX,selectMode)
-    data.window.comboBox.Bind(wx.EVT_COMBOBOX,selectColorMode)
-    data.window.showDressButton.Bind(wx.EVT_BUTTON,lightUp)
-    data.window.radioBox3.Bind(wx.EVT_RADIOBOX,selectDressMode)
-
-def determineRgbBasingOnMode(data):
-    #rgbcodes are different for each color mode
-    if data.colorMode=='red':
-        data.rgbColor=data.sound.findRedIfRedOnly()
-    elif data.colorMode=='yellow':
-        data.rgbColor=data.sound.findYellow()
-    elif data.colorMode=='green':
-        data.rgbColor=data.sound.findGreenIfGreenOnly()
-    elif data.colorMode=='purple':
-        data.rgbColor=data.sound.findPurple()
-    elif data.colorMode=='blue':
-        data.rgbColor=data.sound.findBlueIfBlueOnly()
-    elif data.colorMode=='multicolor':
-        data.rgbColor=(data.sound.findRed(),data.sound.findGreen(),\
-                       data.sound.findBlue())
-
-def findCurrentColor(data):
-    if data.colorMode!='multicolor':
-        (i,j,k)=data.rgbColor
-        currentColor=(i*255,j*255,k*255)
+        #the dress color and its hex name for the pitch just detected, looked
+        #up in self.colors instead of worked out
+        i=self.colors.index(self.currentFreqInMidi)
+        (self.r,self.g,self.b)=self.colors.dress[i].tolist()
+        self.currentColor=self.colors.names[i]
+
+    def findRGBBatch(self,midi):
+        #findRGB's (r,g,b) for an array of pitches, as uint8 rows
+        return self.colors.dress[self.colors.index(midi)]
+
+class LatestValue:
+    #a one-slot channel between threads: put() never waits and replaces
+    #whatever has not been read yet, so a slow reader always gets the
+    #newest value instead of a backlog. any number of readers can follow it,
+    #each remembering the version it saw last
+    def __init__(self):
+        self.lock=threading.Lock()
+        self.version=0
+        self.value=None
+
+    def put(self,value):
+        with self.lock:
+            self.version+=1
+            self.value=value
+
+    def latest(self):
+        #(version,value) of the newest value; version 0 means none yet
+        with self.lock:
+            return (self.version,self.value)
+
+class Analyzer:
+    #runs an Audio's analysis on a thread of its own, so nothing that
+    #shows the results - the preview, the dress - can hold it up. samples
+    #arrive on the capture thread (pyaudio's callback or a GeneratedInput)
+    #and every new window's Analysis, with its dress color, is put on
+    #results. an Analysis's spectrum is reused by the next window, so
+    #readers should only use its other fields
+    def __init__(self,sound):
+        self.sound=sound
+        self.results=LatestValue()
+        self.thread=None
+        self.failures=0 #windows whose analysis raised, and were skipped
+
+    def isRunning(self):
+        return self.thread!=None
+
+    def start(self):
+        if self.isRunning():
+            return
+        self.sound.setUp()
+        self.sound.recording=True
+        self.running=True
+        self.thread=threading.Thread(target=self.run)
+        self.thread.daemon=True
+        self.thread.start()
+
+    def run(self):
+        sound=self.sound
+        poll=sound.hopSize/sound.rate/4 #seconds, a quarter of a hop
+        while self.running:
+            try:
+                analysis=sound.record()
+                if analysis==None:
+                    time.sleep(poll) #the next hop has not arrived yet
+                    continue
+                sound.findRGB()
+            except Exception:
+                #one bad window must not leave the lights frozen on the
+                #last color: say what went wrong the first time, then
+                #carry on with the next window
+                self.failures+=1
+                if self.failures==1:
+                    traceback.print_exc()
+                time.sleep(poll)
+                continue
+            analysis.color=(sound.r,sound.g,sound.b)
+            analysis.colorName=sound.currentColor
+            self.results.put(analysis)
+
+    def stop(self):
+        if not self.isRunning():
+            return
+        self.running=False
+        self.thread.join()
+        self.thread=None
+        self.sound.stopRecording()
+
+defaultLayout=os.path.join(os.path.dirname(os.path.abspath(__file__)),\
+                           'garments','dress.json')
+
+class GarmentLayout:
+    #where the lights of a garment are and how they are wired, read from a
+    #json file such as garments/dress.json:
+    #   "rows"     the rows of leds the arduino drives, top to bottom, each
+    #              with a name and the pins of its red, green and blue leds
+    #   "waist"    how many of those rows are above the waist
+    #   "preview"  how the on-screen model draws the garment:
+    #       "template"   the white garment, [height, radius] of each hoop
+    #       "waterfall"  the led hoops, [height, radius] of each, top down
+    #       "fireworks"  the led points, one list of [x, y, z] per hoop
+    #     the waterfall and fireworks "waist" count their hoops above it
+    #the dress's live modes, the rendered timelines and the model all
+    #follow it, so a bigger garment needs a new file rather than new code
+    def __init__(self,path=defaultLayout):
+        with open(path) as f:
+            try:
+                spec=json.load(f)
+                self.name=spec.get('name',os.path.basename(path))
+                self.rows=[row['name'] for row in spec['rows']]
+                #every row's pins as three tuples, so a flat list fails here
+                self.pinDict=dict((row['name'],\
+                                   tuple(tuple(colorPins)\
+                                         for colorPins in row['pins']))\
+                                  for row in spec['rows'])
+                self.waist=spec['waist']
+                preview=spec['preview']
+                self.templateThickness=preview['template']['thickness']
+                self.template=numpy.array(preview['template']['hoops'],\
+                                          dtype=float).reshape(-1,2)
+                self.spiralThickness=preview['waterfall']['thickness']
+                self.spirals=numpy.array(preview['waterfall']['hoops'],\
+                                         dtype=float).reshape(-1,2)
+                self.points=[numpy.array(hoop,dtype=float).reshape(-1,3)\
+                             for hoop in preview['fireworks']['hoops']]
+                self.topNumberOfHoops={
+                    'waterfall':preview['waterfall']['waist'],
+                    'fireworks':preview['fireworks']['waist']}
+            except (ValueError,KeyError,TypeError) as e:
+                raise ValueError('%s is not a garment layout: %s'%(path,e))
+        pins=[pin for row in self.rows for colorPins in self.pinDict[row]\
+              for pin in colorPins]
+        if any(len(self.pinDict[row])!=3 for row in self.rows):
+            raise ValueError('%s: every row needs red, green and blue pins'\
+                             %path)
+        if any(not isinstance(pin,int) or pin<0 or pin>255 for pin in pins)\
+           or len(set(pins))!=len(pins):
+            raise ValueError('%s: pins must be different numbers 0-255'%path)
+        #each waist counts rows or hoops above it, so it cannot be more
+        #than there are
+        for (what,waist,count) in \
+            [('waist',self.waist,len(self.rows)),
+             ('waterfall waist',self.topNumberOfHoops['waterfall'],\
+              len(self.spirals)),
+             ('fireworks waist',self.topNumberOfHoops['fireworks'],\
+              len(self.points))]:
+            if not isinstance(waist,int) or not 0<=waist<=count:
+                raise ValueError('%s: the %s must be 0-%d'%(path,what,count))
+
+#frames sent to the arduino, decoded by sketch_dec09a.ino:
+#   0xA5, type, payload length, payload..., checksum
+#the checksum is the xor of the type, the length and every payload byte,
+#and the sketch drops any frame that does not check out
+frameStart=0xA5
+setPinsFrame=0x01 #payload: pin,value pairs, all applied at once
+pingFrame=0x02 #the sketch answers with a pongFrame carrying the same payload
+pongFrame=0x03
+baudFrame=0x04 #payload: new baud rate, 4 bytes. answered with a pongFrame
+#at the old rate, then the sketch switches. unless a confirmFrame arrives at
+#the new rate within a second it goes back to the old one
+confirmFrame=0x05 #payload: the new baud rate again, answered with a pongFrame
+
+def encodeFrame(kind,payload):
+    if len(payload)>255:
+        raise ValueError('frame payload too long: %d bytes'%len(payload))
+    body=bytearray([kind,len(payload)])+bytearray(payload)
+    check=0
+    for byte in body:
+        check^=byte
+    return bytes(bytearray([frameStart])+body+bytearray([check]))
+
+class FrameDecoder:
+    #turns bytes from the serial port back into frames, the same way the
+    #sketch does it
+    def __init__(self):
+        self.state='start'
+        self.kind=0
+        self.length=0
+        self.check=0
+        self.payload=bytearray()
+        self.frames=[] #(type,payload) of good frames not yet taken
+
+    def feed(self,data):
+        #decode data, adding any frames it completes to self.frames
+        frames=self.frames
+        for byte in bytearray(data):
+            if self.state=='start':
+                if byte==frameStart:
+                    self.state='type'
+            elif self.state=='type':
+                self.kind=self.check=byte
+                self.state='length'
+            elif self.state=='length':
+                self.length=byte
+                self.check^=byte
+                self.payload=bytearray()
+                self.state='payload' if byte>0 else 'check'
+            elif self.state=='payload':
+                self.payload.append(byte)
+                self.check^=byte
+                if len(self.payload)==self.length:
+                    self.state='check'
+            else:
+                if byte==self.check:
+                    frames.append((self.kind,bytes(self.payload)))
+                self.state='start'
+
+def readFrame(ser,decoder,kind,timeout):
+    #the payload of the next good frame of this kind, or None on timeout.
+    #frames of other kinds are skipped
+    deadline=clock()+timeout
+    while True:
+        while decoder.frames:
+            (frameKind,payload)=decoder.frames.pop(0)
+            if frameKind==kind:
+                return payload
+        if clock()>=deadline:
+            return None
+        decoder.feed(ser.read(max(1,ser.in_waiting)))
+
+class LinkStats:
+    #what the startup handshake measured on the serial link
+    def __init__(self,baud,roundTrip,bytesPerSec):
+        self.baud=baud
+        self.roundTrip=roundTrip #seconds for one small frame there and back
+        self.bytesPerSec=bytesPerSec #sustained, with frames as big as a dress
+
+    def __str__(self):
+        return '%d baud, %0.1f ms round trip, %d bytes/sec'%\
+               (self.baud,self.roundTrip*1000,self.bytesPerSec)
+
+def measureLink(ser,frames=10,size=100):
+    #round trip of one small ping, then a burst of dress-sized pings that
+    #must all come back intact. None if anything is lost or garbled
+    ser.reset_input_buffer()
+    decoder=FrameDecoder()
+    started=clock()
+    ser.write(encodeFrame(pingFrame,b'mg'))
+    if readFrame(ser,decoder,pongFrame,0.5)!=b'mg':
+        return None
+    roundTrip=clock()-started
+    payloads=[bytes(bytearray((i+j)%256 for j in range(size-4)))\
+              for i in range(frames)]
+    #a generous timeout: the burst goes out and comes back at ~baud/10 bytes
+    timeout=0.5+4*frames*size*10/ser.baudrate
+    started=clock()
+    for payload in payloads:
+        ser.write(encodeFrame(pingFrame,payload))
+    for payload in payloads:
+        if readFrame(ser,decoder,pongFrame,timeout)!=payload:
+            return None
+    elapsed=clock()-started
+    return LinkStats(ser.baudrate,roundTrip,frames*size/elapsed)
+
+def waitForArduino(ser,timeout=3):
+    #opening the port resets the board, and nothing is answered until the
+    #bootloader has handed over to the sketch. ping until the sketch
+    #answers instead of always sleeping for the slowest case. True once it
+    #does, False if it never does within timeout seconds
+    decoder=FrameDecoder()
+    deadline=clock()+timeout
+    attempt=0
+    while clock()<deadline:
+        attempt+=1
+        probe=struct.pack('<H',attempt%65536)
+        ser.write(encodeFrame(pingFrame,probe))
+        #pings sent while the sketch was starting can still be answered
+        #late; only the answer to the latest one shows none are left
+        while True:
+            payload=readFrame(ser,decoder,pongFrame,0.1)
+            if payload==probe:
+                return True
+            if payload==None:
+                break
+    return False
+
+def switchBaud(ser,baud):
+    #ask the sketch to change baud rate, then follow it. the new rate is
+    #only kept once measureLink passes and the sketch has answered the
+    #confirmFrame; otherwise both sides end up back at the old rate and
+    #None is returned
+    old=ser.baudrate
+    ser.reset_input_buffer()
+    request=struct.pack('<I',baud)
+    ser.write(encodeFrame(baudFrame,request))
+    answered=readFrame(ser,FrameDecoder(),pongFrame,0.5)==request
+    switched=clock() #when the sketch's second at the new rate began
+    if answered:
+        ser.flush()
+        ser.baudrate=baud
+        time.sleep(0.01)
+        stats=measureLink(ser)
+        #the sketch answers every confirmFrame, so a lost answer can be
+        #asked for again
+        for attempt in range(3 if stats!=None else 0):
+            ser.write(encodeFrame(confirmFrame,request))
+            if readFrame(ser,FrameDecoder(),pongFrame,0.2)==request:
+                return stats
+        ser.baudrate=old
+    #the sketch may have switched even if its answer was lost. it goes
+    #back to the old rate a second after switching, whatever it received
+    time.sleep(max(0,switched+1.2-clock()))
+    ser.reset_input_buffer()
+    return None
+
+#fastest first. all of them divide evenly into the mega's 16MHz clock or
+#are close enough to work
+arduinoBauds=[1000000,500000,250000,115200,57600,19200]
+
+def openArduino(port,baud=None):
+    #open the dress's serial port. the sketch always starts at 9600 baud;
+    #from there it switches to baud, or with baud=None to the fastest rate
+    #in arduinoBauds that passes measureLink. returns (ser,LinkStats)
+    import serial
+    ser=serial.Serial(port,9600,timeout=0.05)
+    if not waitForArduino(ser):
+        ser.close()
+        raise IOError('no answer from the arduino on %s'%port)
+    if baud==None:
+        candidates=arduinoBauds
+    elif baud!=9600:
+        candidates=[baud]
     else:
-        currentColor=data.sound.currentColor
-    return currentColor
-        
-def showDetectedFrequency(data):
-    data.window.fText.SetLabel("%0.2f"%data.sound.currentFreqInMidi)
-    #the color of the text is black so that the background color can be
-    #easily seen
-    data.window.fText.SetForegroundColour((0,0,0))
-    #background corresponds to the frequency detected
-    if data.model.dressPattern!=None and data.colorModeSelected==True:
-        data.window.fText.SetBackgroundColour(findCurrentColor(data))
+        candidates=[]
+    for candidate in candidates:
+        faster=switchBaud(ser,candidate)
+        if faster!=None:
+            stats=faster
+            break
     else:
-        data.window.fText.SetBackgroundColour((255,255,255))
-
-def gatherDetectedFreq(data):
-    if data.mode=='dropping':
-        droppingGatherDetectedFreq(data)
-    elif data.mode=='expanding':
-        expandingGatherDetectedFreq(data)
-
-def droppingGatherDetectedFreq(data):
-    #get new frequency, delete an old frequency
-    if data.model.dressPattern=='waterfall':
-        numberOfHoops=32 #32 circuits
-        if len(data.detectedFreqList)==numberOfHoops:
-            data.detectedFreqList=data.detectedFreqList[1:]+[data.rgbColor]
-        else:
-            data.detectedFreqList.append(data.rgbColor)
-    elif data.model.dressPattern=='fireworks':
-        numberOfHoops=16 #16 circuits
-        if len(data.detectedFreqList)==numberOfHoops:
-            data.detectedFreqList=data.detectedFreqList[1:]+[data.rgbColor]
-        else:
-            data.detectedFreqList.append(data.rgbColor)
-
-def expandingGatherDetectedFreq(data):
-    #the top row is the newest frequency detected and so on
-    if data.model.dressPattern=='waterfall':
-        bottomNumberOfHoops=18
-        if len(data.detectedFreqList)==bottomNumberOfHoops:
-            data.detectedFreqList=data.detectedFreqList[1:]+[data.rgbColor]
-        else:
-            data.detectedFreqList.append(data.rgbColor)
-    elif data.model.dressPattern=='fireworks':
-        bottomNumberOfHoops=9
-        if len(data.detectedFreqList)==bottomNumberOfHoops:
-            data.detectedFreqList=data.detectedFreqList[1:]+[data.rgbColor]
-        else:
-            data.detectedFreqList.append(data.rgbColor)
-        
-def dressChangeColor(data):
-    n=len(data.detectedFreqList)
-    step=calculateLoudness(data)
-    if data.mode=='dropping':
-        droppingDressChangeColor(data,n)
-    elif data.mode=='expanding':
-        expandingDressChangeColor(data,n)
-
-def droppingDressChangeColor(data,n):
-    if data.model.dressPattern=='waterfall':
-        for i in range(0,n):
-            data.model.LEDSpirals[i].color=data.detectedFreqList[n-i-1]
-    elif data.model.dressPattern=='fireworks':
-        for i in range(0,n):
-            data.model.LEDPoints[i].color=data.detectedFreqList[n-i-1]
-
-def expandingDressChangeColor(data,n):
-    #similar to doppingChangeColor but loops differently
-    if data.model.dressPattern=='waterfall':
-        topNumberOfHoops,totalHoops=14,32
-        #expand towards top
-        j=0
-        for i in range(topNumberOfHoops-1,-1,-1):
-            if j>=n: break
-            data.model.LEDSpirals[i].color=data.detectedFreqList[n-j-1]
-            j+=1
-        #expand towards bottom
-        j=0
-        for i in range(topNumberOfHoops,totalHoops):
-            if j>=n: break
-            data.model.LEDSpirals[i].color=data.detectedFreqList[n-j-1]
-            j+=1
-    elif data.model.dressPattern=='fireworks':
-        topNumberOfHoops,totalHoops=7,16
-        #expand towards top
-        j=0
-        for i in range(topNumberOfHoops-1,-1,-1):
-            if j>=n: break
-            data.model.LEDPoints[i].color=data.detectedFreqList[n-j-1]
-            j+=1
-        #expand towards bottom
-        j=0
-        for i in range(topNumberOfHoops,totalHoops):
-            if j>=n: break
-            data.model.LEDPoints[i].color=data.detectedFreqList[n-j-1]
-            j+=1
-
-def dressChange(data):
-    data.screen1.select()
-    gatherDetectedFreq(data)
-    dressChangeColor(data)
-    
-def barsChangeHeight(data):
-    #height changes with frequency
-    data.bars.redBar.axis=(0,data.rgbColor[0]*10,0)
-    data.bars.redBar.height=data.rgbColor[0]
-    data.bars.greenBar.axis=(0,data.rgbColor[1]*10,0)
-    data.bars.greenBar.height=data.rgbColor[1]
-    data.bars.blueBar.axis=(0,data.rgbColor[2]*10,0)
-    data.bars.blueBar.height=data.rgbColor[2]
-
-def barsChangeOpacity(data):
-    #opacity changes with loudness
-    data.bars.redBar.opacity=data.loudness
-    data.bars.greenBar.opacity=data.loudness
-    data.bars.blueBar.opacity=data.loudness
-
-def barsChangeLabel(data):
-    rgbSum=data.rgbColor[0]+data.rgbColor[1]+data.rgbColor[2]
-    data.bars.redness.text='%0.2f'%(data.rgbColor[0]/rgbSum*100)+'%'
-    data.bars.greenness.text='%0.2f'%(data.rgbColor[1]/rgbSum*100)+'%'
-    data.bars.blueness.text='%0.2f'%(data.rgbColor[2]/rgbSum*100)+'%'
-
-def barsChange(data):
-    data.screen2.select()
-    barsChangeHeight(data)
-    barsChangeOpacity(data)
-    barsChangeLabel(data)
-
-def runDress(data):
-    if data.dressMode=='demo':
-        data.dress.dressDemo()
-    elif data.dressMode=='dropping':
-        data.dress.dressLightUpInMode1()
-    elif data.dressMode=='expanding':
-        data.dress.dressLightUpInMode2()
+        if baud!=None and baud!=9600:
+            ser.close()
+            raise IOError('could not talk to the arduino at %d baud'%baud)
+        #staying at 9600, where the burst takes seconds, so only now
+        stats=measureLink(ser)
+        if stats==None:
+            ser.close()
+            raise IOError('the link to the arduino on %s is unreliable'%port)
+    return ser,stats
+
+class SerialWriter:
+    #owns the serial port on its own thread, so recording and drawing never
+    #wait for the uart. up to maxFrames frames queue up; when the link falls
+    #behind, the oldest waiting frame is dropped, since every frame holds
+    #the whole dress and the newest one is all that needs showing
+    def __init__(self,ser,maxFrames=2):
+        self.ser=ser
+        self.frames=queue.Queue(maxFrames)
+        self.sent=0
+        self.dropped=0
+        #set to a list to get (time queued,time sent,bytes) of every frame
+        #that goes out, for benchmark.py
+        self.log=None
+        self.thread=threading.Thread(target=self.run)
+        self.thread.daemon=True
+        self.thread.start()
+
+    def write(self,frame):
+        #never blocks
+        while True:
+            try:
+                self.frames.put_nowait((frame,clock()))
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self.dropped+=1
+                except queue.Empty:
+                    pass
+
+    def run(self):
+        while True:
+            (frame,queued)=self.frames.get()
+            if frame==None: #close() was called
+                break
+            self.ser.write(frame)
+            self.sent+=1
+            if self.log!=None:
+                self.log.append((queued,clock(),len(frame)))
 
-class Dress:
+    def close(self):
+        #send what is still queued, then let go of the port
+        self.write(None)
+        self.thread.join()
+        self.ser.close()
+
+class FrameScheduler:
+    #paces an animation by when each step is due on the clock instead of
+    #sleeping a fixed time after it, so the time a step spends drawing and
+    #queueing its frame comes out of the wait rather than adding to it and
+    #the animation keeps its tempo. a step that comes due late is counted
+    #in missed and run at once; one late by more than its whole interval
+    #starts the schedule again from now rather than rushing to catch up
     def __init__(self):
+        self.due=None #when the last step was due, set by the first wait()
+        self.steps=0
+        self.missed=0
+        self.worst=0 #seconds the latest step has been late by
+
+    def wait(self,seconds):
+        #until seconds after the last step was due, or after now the first
+        #time
+        now=clock()
+        if self.due==None:
+            self.due=now
+        self.due+=seconds
+        self.steps+=1
+        late=now-self.due
+        if late<=0:
+            time.sleep(-late)
+            return
+        self.missed+=1
+        self.worst=max(self.worst,late)
+        if late>seconds:
+            self.due=now
+
+    def __str__(self):
+        return '%d of %d deadlines missed, by up to %0.1f ms'%\
+               (self.missed,self.steps,self.worst*1000)
+
+class Dress:
+    def __init__(self,port='/dev/cu.usbmodem1411',baud=None,layout=None):
+        #baud=None picks the fastest rate the link handles reliably.
+        #layout is a GarmentLayout, garments/dress.json unless given.
+        #nothing is opened here: the serial link when connect() is called,
+        #or by the first flush(), and the microphone by listen()
+        self.port=port
+        self.baud=baud
+        self.ser=None
+        self.link=None #the LinkStats of the handshake, once connected
+        self.writer=None
         self.audio=Audio()
-        self.initArduino()
-
-    def initArduino(self):
-        #set up pins
-        self.pinDict={'row1':([2],[3],[4]),'row2':([5],[6],[7]),\
-                      'row3':([8],[10],[9]),'row4':([11],[12],[14]),\
-                      'row5':([15],[16],[17]),'row6':([18,21],[19,22],[20,23]),\
-                      'row7':([24,27],[25,28],[26,29]),'row8':([30],[31],[32]),\
-                      'row9':([33],[34],[35]),'row10':([36],[37],[38]),\
-                      'row11':([39],[40],[41]),'row12':([42],[43],[44]),\
-                      'row13':([45],[46],[47]),'row14':([48],[49],[50])}
-        self.ser=serial.Serial('/dev/cu.usbmodem1411',9600)
-        time.sleep(2) #wait for everything to initialize
+        #where the live modes get their colors: the results of an Analyzer
+        #shared with the display if one is given, otherwise of their own
+        self.results=None
+        self.analyzer=None
+        self.running=True #the light-up loops run until stop()
+        self.schedule=FrameScheduler() #each light-up mode starts a new one
+        if layout==None:
+            layout=GarmentLayout()
+        self.layout=layout
+        self.pinDict=self.layout.pinDict
+        self.initFrame()
+
+    def isConnected(self):
+        return self.writer!=None
+
+    def connect(self):
+        #the handshake with the arduino, which resets when the port opens
+        if self.isConnected():
+            return
+        (self.ser,self.link)=openArduino(self.port,self.baud)
+        self.writer=SerialWriter(self.ser)
+
+    def initFrame(self):
+        #the whole dress is kept as one (rows,3) array of colors. callers
+        #change any rows they like and flush() sends all of it in one frame
+        self.rows=list(self.layout.rows) #top to bottom
+        self.rowIndex=dict((row,i) for (i,row) in enumerate(self.rows))
+        self.frame=numpy.zeros((len(self.rows),3),dtype=numpy.uint8)
+        #which row and color each pin shows, worked out once so flush() is
+        #a single gather
+        pins,rowOfPin,colorOfPin=[],[],[]
+        for (i,row) in enumerate(self.rows):
+            for (color,colorPins) in enumerate(self.pinDict[row]):
+                for pin in colorPins:
+                    pins.append(pin)
+                    rowOfPin.append(i)
+                    colorOfPin.append(color)
+        self.rowOfPin=numpy.array(rowOfPin)
+        self.colorOfPin=numpy.array(colorOfPin)
+        self.payload=numpy.zeros(2*len(pins),dtype=numpy.uint8)
+        self.payload[0::2]=pins
+        #a frame carries at most 255 bytes, so a garment with more than 127
+        #pins is sent as several frames, written together
+        step=2*(255//2)
+        self.parts=[(start,start+step)\
+                    for start in range(0,len(self.payload),step)]
+        #the colors of the last few steps of a live mode, one per row
+        self.history=ColorHistory(len(self.rows),numpy.uint8)
+        self.waist=self.layout.waist #number of rows above it
+
+    def setRow(self,row,r,g,b):
+        self.frame[self.rowIndex[row]]=(r,g,b)
+
+    def setAll(self,r,g,b):
+        self.frame[:]=(r,g,b)
+
+    def flush(self):
+        #send the state of every row in one write. the sketch only applies
+        #a frame once all of it has arrived, so the dress changes at once
+        self.payload[1::2]=self.frame[self.rowOfPin,self.colorOfPin]
+        if not self.isConnected():
+            self.connect()
+        if len(self.parts)==1:
+            self.writer.write(encodeFrame(setPinsFrame,self.payload))
+        else:
+            self.writer.write(b''.join(encodeFrame(setPinsFrame,\
+                                                   self.payload[start:end])\
+                                       for (start,end) in self.parts))
+
+    def stop(self):
+        #the running light-up mode returns after its current sweep
+        self.running=False
+
+    def close(self):
+        if self.analyzer!=None:
+            self.analyzer.stop()
+        if self.isConnected():
+            self.writer.close()
+
+    def listen(self):
+        if self.results==None:
+            self.analyzer=Analyzer(self.audio)
+            self.analyzer.start()
+            self.results=self.analyzer.results
+        return self.results
+
+    def flashRow(self,row,r,g,b,on,off):
+        #light up one row for on seconds, then leave it dark for off seconds
+        self.setRow(row,r,g,b)
+        self.flush()
+        self.schedule.wait(on)
+        self.setRow(row,0,0,0) #turn off
+        self.flush()
+        self.schedule.wait(off)
+
+    def playTimeline(self,path,loop=False):
+        #play a timeline made by 'dress.py render' with no microphone and no
+        #fft. the file is memory-mapped rather than read in, and whatever
+        #frame is due on the clock is the one sent, so a slow serial link
+        #drops frames instead of falling behind the music
+        frames,rate,hop=readTimeline(path)
+        if frames.shape[1]!=len(self.rows):
+            raise ValueError('%s has %d rows, the garment has %d'%\
+                             (path,frames.shape[1],len(self.rows)))
+        period=hop/rate
+        self.connect() #before the show's clock starts, not on its time
+        while self.running:
+            start=clock()
+            i=0
+            while i<len(frames) and self.running:
+                #nothing to send if the dress already looks like this
+                if i==0 or (frames[i]!=self.frame).any():
+                    self.frame[:]=frames[i]
+                    self.flush()
+                #wait for the next frame, or skip to the one due by now
+                i=max(i+1,int((clock()-start)/period))
+                wait=start+i*period-clock()
+                if wait>0:
+                    time.sleep(wait)
+            if not loop:
+                break
 
     def dressDemo(self):
         self.mode='demo'
-        while True:
+        self.schedule=FrameScheduler()
+        while self.running:
             self.redBottomUp()
             self.greenTopDown()
             self.blueBottomUp()
@@ -997,302 +1538,253 @@ class Dress:
             self.greenBottomUp()
             self.blueTopDown()
 
+    def sweep(self,r,g,b,rows):
+        for row in rows:
+            self.flashRow(row,r,g,b,0.05,0.25)
+
     def redBottomUp(self):
-        (r,g,b)=(255,0,0)
-        d=self.pinDict
-        ser=self.ser
-        for i in range(13,-1,-1):
-            row='row'+str(i+1)
-            if len(d[row][0])==1: #other areas
-                ser.write(str(d[row][0][0])+" "+str(r)+' '+str(d[row][1][0])+" "\
-                      +str(g)+' '+str(d[row][2][0])+" "+str(b)+'\n')
-                time.sleep(0.05)
-                ser.write(str(d[row][0][0])+" "+'0'+' '+str(d[row][1][0])+" "\
-                      +'0'+' '+str(d[row][2][0])+" "+'0'+'\n')
-
-            else: #waistband
-                ser.write(str(d[row][0][0])+" "+\
-                                str(r)+' '+str(d[row][1][0])+" "+str(g)+' '+\
-                                str(d[row][2][0])+" "+str(b)+" "+\
-                                str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                str(d[row][2][1])+'\n')
-                time.sleep(0.05)
-                ser.write(str(d[row][0][0])+" "+\
-                                '0'+' '+str(d[row][1][0])+" "+'0'+' '+\
-                                str(d[row][2][0])+" "+'0'+" "+\
-                                str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                str(d[row][2][1])+'\n')
-            time.sleep(0.25)
+        self.sweep(255,0,0,reversed(self.rows))
 
     def greenTopDown(self):
-        d=self.pinDict
-        ser=self.ser
-        (r,g,b)=(0,255,0)
-        for i in range(14):
-            row='row'+str(i+1)
-            if len(d[row][0])==1: #other areas
-                ser.write(str(d[row][0][0])+" "+str(r)+' '+str(d[row][1][0])+" "\
-                      +str(g)+' '+str(d[row][2][0])+" "+str(b)+'\n')
-                time.sleep(0.05)
-                ser.write(str(d[row][0][0])+" "+'0'+' '+str(d[row][1][0])+" "\
-                      +'0'+' '+str(d[row][2][0])+" "+'0'+'\n')
-
-            else: #waistband
-                ser.write(str(d[row][0][0])+" "+\
-                                str(r)+' '+str(d[row][1][0])+" "+str(g)+' '+\
-                                str(d[row][2][0])+" "+str(b)+" "+\
-                                str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                str(d[row][2][1])+'\n')
-                time.sleep(0.05)
-                ser.write(str(d[row][0][0])+" "+\
-                                '0'+' '+str(d[row][1][0])+" "+'0'+' '+\
-                                str(d[row][2][0])+" "+'0'+" "+\
-                                str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                str(d[row][2][1])+'\n')
-
-            time.sleep(0.25)
+        self.sweep(0,255,0,self.rows)
 
     def blueBottomUp(self):
-        d=self.pinDict
-        ser=self.ser
-        (r,g,b)=(0,0,255)
-        for i in range(13,-1,-1):
-            row='row'+str(i+1)
-            if len(d[row][0])==1: #other areas
-                ser.write(str(d[row][0][0])+" "+str(r)+' '+str(d[row][1][0])+" "\
-                      +str(g)+' '+str(d[row][2][0])+" "+str(b)+'\n')
-                time.sleep(0.05)
-                ser.write(str(d[row][0][0])+" "+'0'+' '+str(d[row][1][0])+" "\
-                      +'0'+' '+str(d[row][2][0])+" "+'0'+'\n')
-
-            else: #waistband
-                ser.write(str(d[row][0][0])+" "+\
-                                str(r)+' '+str(d[row][1][0])+" "+str(g)+' '+\
-                                str(d[row][2][0])+" "+str(b)+" "+\
-                                str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                str(d[row][2][1])+'\n')
-                time.sleep(0.05)
-                ser.write(str(d[row][0][0])+" "+\
-                                '0'+' '+str(d[row][1][0])+" "+'0'+' '+\
-                                str(d[row][2][0])+" "+'0'+" "+\
-                                str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                str(d[row][2][1])+'\n')
-            time.sleep(0.25)
+        self.sweep(0,0,255,reversed(self.rows))
 
     def redTopDown(self):
-        d=self.pinDict
-        ser=self.ser
-        (r,g,b)=(255,0,0)
-        for i in range(14):
-            row='row'+str(i+1)
-            if len(d[row][0])==1: #other areas
-                ser.write(str(d[row][0][0])+" "+str(r)+' '+str(d[row][1][0])+" "\
-                      +str(g)+' '+str(d[row][2][0])+" "+str(b)+'\n')
-                time.sleep(0.05)
-                ser.write(str(d[row][0][0])+" "+'0'+' '+str(d[row][1][0])+" "\
-                      +'0'+' '+str(d[row][2][0])+" "+'0'+'\n')
-
-            else: #waistband
-                ser.write(str(d[row][0][0])+" "+\
-                                str(r)+' '+str(d[row][1][0])+" "+str(g)+' '+\
-                                str(d[row][2][0])+" "+str(b)+" "+\
-                                str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                str(d[row][2][1])+'\n')
-                time.sleep(0.05)
-                ser.write(str(d[row][0][0])+" "+\
-                                '0'+' '+str(d[row][1][0])+" "+'0'+' '+\
-                                str(d[row][2][0])+" "+'0'+" "+\
-                                str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                str(d[row][2][1])+'\n')
-            time.sleep(0.25)
+        self.sweep(255,0,0,self.rows)
 
     def greenBottomUp(self):
-        d=self.pinDict
-        ser=self.ser
-        (r,g,b)=(0,255,0)
-        for i in range(13,-1,-1):
-            row='row'+str(i+1)
-            if len(d[row][0])==1: #other areas
-                ser.write(str(d[row][0][0])+" "+str(r)+' '+str(d[row][1][0])+" "\
-                      +str(g)+' '+str(d[row][2][0])+" "+str(b)+'\n')
-                time.sleep(0.05)
-                ser.write(str(d[row][0][0])+" "+'0'+' '+str(d[row][1][0])+" "\
-                      +'0'+' '+str(d[row][2][0])+" "+'0'+'\n')
-
-            else: #waistband
-                ser.write(str(d[row][0][0])+" "+\
-                                str(r)+' '+str(d[row][1][0])+" "+str(g)+' '+\
-                                str(d[row][2][0])+" "+str(b)+" "+\
-                                str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                str(d[row][2][1])+'\n')
-                time.sleep(0.05)
-                ser.write(str(d[row][0][0])+" "+\
-                                '0'+' '+str(d[row][1][0])+" "+'0'+' '+\
-                                str(d[row][2][0])+" "+'0'+" "+\
-                                str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                str(d[row][2][1])+'\n')
-
-            time.sleep(0.25)
+        self.sweep(0,255,0,reversed(self.rows))
 
     def blueTopDown(self):
-        d=self.pinDict
-        ser=self.ser
-        (r,g,b)=(0,0,255)
-        for i in range(14):
-            row='row'+str(i+1)
-            if len(d[row][0])==1: #other areas
-                ser.write(str(d[row][0][0])+" "+str(r)+' '+str(d[row][1][0])+" "\
-                      +str(g)+' '+str(d[row][2][0])+" "+str(b)+'\n')
-                time.sleep(0.05)
-                ser.write(str(d[row][0][0])+" "+'0'+' '+str(d[row][1][0])+" "\
-                      +'0'+' '+str(d[row][2][0])+" "+'0'+'\n')
-
-            else: #waistband
-                ser.write(str(d[row][0][0])+" "+\
-                                str(r)+' '+str(d[row][1][0])+" "+str(g)+' '+\
-                                str(d[row][2][0])+" "+str(b)+" "+\
-                                str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                str(d[row][2][1])+'\n')
-                time.sleep(0.05)
-                ser.write(str(d[row][0][0])+" "+\
-                                '0'+' '+str(d[row][1][0])+" "+'0'+' '+\
-                                str(d[row][2][0])+" "+'0'+" "+\
-                                str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                str(d[row][2][1])+'\n')
-            time.sleep(0.25) 
+        self.sweep(0,0,255,self.rows)
+
+    def showHistory(self,mode):
+        #light every row from self.history: 'dropping' starts each color at
+        #the top row and moves it down a row every step, 'expanding' starts
+        #it at the waist and moves it towards the top and the bottom
+        if mode=='dropping':
+            (which,colors)=self.history.dropping(len(self.rows))
+        else:
+            (which,colors)=self.history.expanding(self.waist,len(self.rows))
+        self.frame[:]=0 #rows no color has reached yet stay dark
+        self.frame[which]=colors
+        self.flush()
+
+    def lightUpHistory(self,mode,step):
+        #the newest color from the microphone every step seconds
+        results=self.listen()
+        self.connect() #while the microphone fills its first window
+        self.history.clear()
+        self.schedule=FrameScheduler()
+        while self.running:
+            (version,analysis)=results.latest()
+            if analysis!=None:
+                self.history.push(analysis.color)
+                self.showHistory(mode)
+            self.schedule.wait(step)
 
     def dressLightUpInMode1(self):
-        d=self.pinDict
-        ser=self.ser
-        while True:
-            for i in range(14):
-                self.audio.startRecording()
-                self.audio.findRGB()
-                (r,g,b)=(self.audio.r,self.audio.g,self.audio.b)
-                row='row'+str(i+1)
-                if len(d[row][0])==1: #other areas
-                    ser.write(str(d[row][0][0])+" "+str(r)+' '+str(d[row][1][0])+" "\
-                          +str(g)+' '+str(d[row][2][0])+" "+str(b)+'\n')
-                    time.sleep(0.1)
-                    ser.write(str(d[row][0][0])+" "+'0'+' '+str(d[row][1][0])+" "\
-                          +'0'+' '+str(d[row][2][0])+" "+'0'+'\n') #turn off
-                else: #waistband
-                    ser.write(str(d[row][0][0])+" "+\
-                                    str(r)+' '+str(d[row][1][0])+" "+str(g)+' '+\
-                                    str(d[row][2][0])+" "+str(b)+" "+\
-                                    str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                    str(d[row][2][1])+'\n')
-                    time.sleep(0.1)
-                    ser.write(str(d[row][0][0])+" "+\
-                                    '0'+' '+str(d[row][1][0])+" "+'0'+' '+\
-                                    str(d[row][2][0])+" "+'0'+" "+\
-                                    str(d[row][0][1])+" "+str(d[row][1][1])+" "+\
-                                    str(d[row][2][1])+'\n') #turn off
-                time.sleep(0.1)
-
-    def lightUpBottomOnly(self,bottomRow,d,ser,r,g,b):
-        if len(d[bottomRow][0])==1: #other areas
-            ser.write(str(d[bottomRow][0][0])+" "+str(r)+' '+\
-                      str(d[bottomRow][1][0])+" "+str(g)+' '+\
-                      str(d[bottomRow][2][0])+" "+str(b)+'\n')
-            time.sleep(0.1)
-            ser.write(str(d[bottomRow][0][0])+" "+'0'+' '+\
-                      str(d[bottomRow][1][0])+" "+'0'+' '+\
-                      str(d[bottomRow][2][0])+" "+'0'+'\n') #turn off
-        else: #waistband
-            ser.write(str(d[bottomRow][0][0])+" "+str(r)+' '+\
-                  str(d[bottomRow][1][0])+" "+str(g)+' '+\
-                  str(d[bottomRow][2][0])+" "+str(b)+" "+\
-                  str(d[bottomRow][0][1])+" "+str(d[bottomRow][1][1])+\
-                  " "+str(d[bottomRow][2][1])+'\n')
-            time.sleep(0.1)
-            ser.write(str(d[bottomRow][0][0])+" "+'0'+' '+\
-                  str(d[bottomRow][1][0])+" "+'0'+' '+\
-                  str(d[bottomRow][2][0])+" "+'0'+" "+\
-                  str(d[bottomRow][0][1])+" "+str(d[bottomRow][1][1])+\
-                  " "+str(d[bottomRow][2][1])+'\n') #turn off
-        time.sleep(0.1)
-
-    def lightUpBoth(self,topRow,bottomRow,d,ser,r,g,b):
-        if len(d[topRow][0])==1: #other areas
-            ser.write(str(d[topRow][0][0])+" "+str(r)+' '+\
-                      str(d[topRow][1][0])+" "+str(g)+' '+\
-                      str(d[topRow][2][0])+" "+str(b)+" "+\
-                      str(d[bottomRow][0][0])+" "+str(d[bottomRow][1][0])+\
-                      " "+str(d[bottomRow][2][0])+'\n')
-            time.sleep(0.1)
-            ser.write(str(d[topRow][0][0])+" "+'0'+' '+\
-                      str(d[topRow][1][0])+" "+'0'+' '+\
-                      str(d[topRow][2][0])+" "+'0'+" "+\
-                      str(d[bottomRow][0][0])+" "+str(d[bottomRow][1][0])+\
-                      " "+str(d[bottomRow][2][0])+'\n') #turn off
-        else: #waistband
-            ser.write(str(d[topRow][0][0])+" "+str(r)+' '+\
-                      str(d[topRow][1][0])+" "+str(g)+' '+\
-                      str(d[topRow][2][0])+" "+str(b)+" "+\
-                      str(d[topRow][0][1])+" "+str(d[topRow][1][1])+" "+\
-                      str(d[topRow][2][1])+" "+str(d[bottomRow][0][0])+" "+\
-                      str(d[bottomRow][1][0])+" "+str(d[bottomRow][2][0])+\
-                      " "+str(d[bottomRow][0][1])+" "+\
-                      str(d[bottomRow][1][1])+" "+\
-                      str(d[bottomRow][2][1])+'\n')
-            time.sleep(0.1)
-            ser.write(str(d[topRow][0][0])+" "+'0'+' '+\
-                      str(d[topRow][1][0])+" "+'0'+' '+\
-                      str(d[topRow][2][0])+" "+'0'+" "+\
-                      str(d[topRow][0][1])+" "+str(d[topRow][1][1])+" "+\
-                      str(d[topRow][2][1])+" "+str(d[bottomRow][0][0])+\
-                      " "+str(d[bottomRow][1][0])+" "+\
-                      str(d[bottomRow][2][0])+" "+str(d[bottomRow][0][1])+\
-                      " "+str(d[bottomRow][1][1])+" "+\
-                      str(d[bottomRow][2][1])+'\n') #turn off
-        time.sleep(0.1)            
+        self.lightUpHistory('dropping',0.2)
 
     def dressLightUpInMode2(self):
-        d=self.pinDict
-        ser=self.ser
-        while True:
-            for i in range(8):
-               topRow='row'+str(6-i)
-               bottomRow='row'+str(7+i)
-               self.audio.startRecording()
-               self.audio.findRGB()
-               (r,g,b)=(self.audio.r,self.audio.g,self.audio.b)
-               topRow='row'+str(6-i)
-               bottomRow='row'+str(7+i)
-               #only light up the bottom part
-               #top part waits for the bottom to finish
-               #since the bottom has more strings
-               if i>=6:
-                   self.lightUpBottomOnly(bottomRow,d,ser,r,g,b)
-                   #when both top and bottom turn on together
-               else:
-                   self.lightUpBoth(topRow,bottomRow,d,ser,r,g,b)
-        
-def runVisual():
-    class Struct: pass
-    data=Struct()
-    initWindow(data)
-    mousePressed(data)
-    while True:
-        rate(20)
-        #rotate the model
-        data.model.frame.rotate(axis=data.model.axis,angle=2*pi/100)
-        #rotate the bars
-        data.bars.frame.rotate(axis=data.bars.axis,angle=2*pi/100)
-        if data.sound.recording==True:
-            data.sound.startRecording()
-            showDetectedFrequency(data)
-        if data.colorModeSelected==False or data.colorMode==None or \
-           data.model.dressPattern==None or data.sound.recording==False:
-            continue
-        determineRgbBasingOnMode(data)
-        data.sound.findRGB()
-        calculateLoudness(data)
-        #show color of the dress (corresponds to the frequency detected)
-        dressChange(data)
-        #show change of heights of the bars
-        barsChange(data)
-
-runVisual()
+        self.lightUpHistory('expanding',0.2)
+
+#timeline files hold one (r,g,b) per row of the dress for every frame of a
+#show. all numbers are little-endian:
+#   bytes 0-3    b'MGTL'
+#   byte  4      format version, 1
+#   byte  5      rows per frame
+#   bytes 6-7    unused, 0
+#   bytes 8-11   sample rate of the source audio
+#   bytes 12-15  hop, in samples: a frame lasts hop/rate seconds
+#   bytes 16-19  number of frames
+#   then frames*rows*3 bytes, uint8 r,g,b for row1, row2... of each frame
+timelineHeader=struct.Struct('<4sBBHIII')
+timelineMagic=b'MGTL'
+
+def writeTimeline(path,frames,rate,hop):
+    #frames is a (frames,rows,3) uint8 array
+    with open(path,'wb') as f:
+        f.write(timelineHeader.pack(timelineMagic,1,frames.shape[1],0,rate,\
+                                    hop,frames.shape[0]))
+        f.write(numpy.ascontiguousarray(frames,dtype=numpy.uint8).tobytes())
+
+def readTimeline(path):
+    #(frames,rate,hop) of a timeline file, where frames is a read-only
+    #(frames,rows,3) array memory-mapped from the file
+    with open(path,'rb') as f:
+        header=f.read(timelineHeader.size)
+    if len(header)<timelineHeader.size:
+        raise ValueError('%s is not a timeline file'%path)
+    magic,version,rows,unused,rate,hop,n=timelineHeader.unpack(header)
+    if magic!=timelineMagic or version!=1:
+        raise ValueError('%s is not a timeline file'%path)
+    if n==0:
+        raise ValueError('%s has no frames'%path)
+    frames=numpy.memmap(path,dtype=numpy.uint8,mode='r',\
+                        offset=timelineHeader.size,shape=(n,rows,3))
+    return frames,rate,hop
+
+def timelineRows(colors,rows,mode,waist):
+    #spread one color per frame over the rows the way the live modes do:
+    #'dropping' starts each color at the top row and moves it down a row
+    #every frame, 'expanding' starts it at the waist (the rows either side
+    #of it; waist rows are above it) and moves it towards the top and the
+    #bottom
+    if mode=='dropping':
+        delay=numpy.arange(rows)
+    else:
+        delay=numpy.abs(numpy.arange(rows)-waist+0.5).astype(int)
+    which=numpy.arange(len(colors))[:,None]-delay[None,:]
+    frames=colors[numpy.maximum(which,0)]
+    frames[which<0]=0 #nothing has reached these rows yet
+    return frames
+
+def readWave(path):
+    #(samples,rate) of a wav file, mixed down to mono, as floats on the
+    #same scale as 16 bit samples
+    w=wave.open(path,'rb')
+    channels,width,rate=w.getnchannels(),w.getsampwidth(),w.getframerate()
+    raw=w.readframes(w.getnframes())
+    w.close()
+    if width==1: #8 bit wav files are unsigned
+        samples=(numpy.frombuffer(raw,dtype=numpy.uint8).astype(float)-128)*256
+    elif width==2:
+        samples=numpy.frombuffer(raw,dtype='<i2').astype(float)
+    elif width==4:
+        samples=numpy.frombuffer(raw,dtype='<i4')/65536.0
+    else:
+        raise ValueError('unsupported sample width: %d bytes'%width)
+    return samples.reshape(-1,channels).mean(axis=1),rate
+
+def runOffline(wavPath,timelinePath,mode='dropping',detector='fft',\
+               layout=None,hopSize=1024):
+    #render a whole recording into a timeline, far faster than real time
+    started=time.time()
+    if layout==None:
+        layout=GarmentLayout()
+    (samples,rate)=readWave(wavPath)
+    sound=Audio(detector,rate=rate,hopSize=hopSize)
+    midi,loudness=sound.analyzeBatch(samples)
+    if len(midi)==0:
+        raise ValueError('%s is shorter than one analysis window (%d samples)'\
+                         %(wavPath,sound.windowSize))
+    colors=sound.findRGBBatch(midi)
+    rows=len(layout.rows) #one color per row of the garment
+    writeTimeline(timelinePath,timelineRows(colors,rows,mode,layout.waist),\
+                  rate,sound.hopSize)
+    seconds=len(samples)/rate
+    elapsed=time.time()-started
+    print('%d frames (%0.1f s of audio) in %0.2f s, %0.0fx real time'%\
+          (len(midi),seconds,elapsed,seconds/max(elapsed,1e-9)))
+
+headlessModes={'demo':'dressDemo',
+               'dropping':'dressLightUpInMode1',
+               'expanding':'dressLightUpInMode2'}
+
+def switchOff(garment):
+    #stop whatever the dress is doing, turn it dark and let go of the port
+    #once every queued frame has gone out
+    garment.stop()
+    if garment.isConnected():
+        garment.setAll(0,0,0)
+        garment.flush()
+    garment.close()
+
+def runTimeline(path,loop=False,port='/dev/cu.usbmodem1411',baud=None,\
+                layout=None):
+    #play a rendered show on the dress until it ends or ctrl-c
+    garment=Dress(port,baud,layout)
+    try:
+        garment.connect()
+        print('dress connected:',garment.link)
+        garment.playTimeline(path,loop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        switchOff(garment)
+
+def runHeadless(mode='dropping',port='/dev/cu.usbmodem1411',baud=None,\
+                layout=None,detector='fft',hopSize=1024):
+    #the microphone straight to the dress with no preview, for the
+    #controller worn with the garment. only numpy, pyaudio and pyserial
+    #are loaded; ctrl-c turns the dress off and lets go of the port
+    garment=Dress(port,baud,layout)
+    garment.audio=Audio(detector,hopSize=hopSize)
+    try:
+        if mode!='demo':
+            garment.listen() #the microphone fills its first window meanwhile
+        garment.connect()
+        print('dress connected:',garment.link)
+        getattr(garment,headlessModes[mode])()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(garment.schedule)
+        switchOff(garment)
+
+def runVisual(port='/dev/cu.usbmodem1411',baud=None,layout=None,\
+              detector='fft',hopSize=1024):
+    #the preview lives in preview.py so that nothing else pulls in visual
+    #and wx, which take seconds to load and are not on the controller
+    import preview
+    preview.runVisual(port,baud,layout,detector,hopSize)
+
+def main():
+    loadPalettes()
+    if len(sys.argv)<2:
+        #no command, as when run from VIDLE: the interactive display
+        runVisual()
+        return
+    parser=argparse.ArgumentParser(description='Musical Garment')
+    commands=parser.add_subparsers(dest='command')
+    link=argparse.ArgumentParser(add_help=False)
+    link.add_argument('--port',default='/dev/cu.usbmodem1411',\
+                      help="the arduino's serial port")
+    link.add_argument('--baud',type=int,default=None,\
+                      help='serial baud rate (default: fastest that works)')
+    garment=argparse.ArgumentParser(add_help=False)
+    garment.add_argument('--layout',default=defaultLayout,\
+                         help='garment layout file (default: %(default)s)')
+    analysis=argparse.ArgumentParser(add_help=False)
+    analysis.add_argument('--detector',choices=sorted(pitchDetectors),\
+                          default='fft',help='pitch detector (default: fft)')
+    analysis.add_argument('--hop',type=int,default=1024,\
+                          help='samples between pitch updates (default: 1024)')
+    commands.add_parser('show',parents=[link,garment,analysis],\
+                        help='the interactive display (the default)')
+    run=commands.add_parser('run',parents=[link,garment,analysis],\
+                            help='light up the dress with no display')
+    run.add_argument('--mode',choices=sorted(headlessModes),\
+                     default='dropping')
+    render=commands.add_parser('render',parents=[garment,analysis],\
+                               help='turn a wav file into a light show')
+    render.add_argument('wav')
+    render.add_argument('timeline')
+    render.add_argument('--mode',choices=['dropping','expanding'],\
+                        default='dropping')
+    play=commands.add_parser('play',parents=[link,garment],\
+                             help='light up the dress from a timeline')
+    play.add_argument('timeline')
+    play.add_argument('--loop',action='store_true')
+    args=parser.parse_args()
+    layout=GarmentLayout(args.layout)
+    if args.command=='show':
+        runVisual(args.port,args.baud,layout,args.detector,args.hop)
+    elif args.command=='run':
+        runHeadless(args.mode,args.port,args.baud,layout,args.detector,\
+                    args.hop)
+    elif args.command=='render':
+        runOffline(args.wav,args.timeline,args.mode,args.detector,layout,\
+                   args.hop)
+    elif args.command=='play':
+        runTimeline(args.timeline,args.loop,args.port,args.baud,layout)
+
+if __name__=='__main__':
+    #run as a script this file is __main__, but preview.py imports it as
+    #dress; go through that one copy so both see the same palettes
+    import dress
+    dress.main()
 
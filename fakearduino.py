@@ -0,0 +1,181 @@
+from __future__ import print_function,division
+#a stand-in for the Mega running sketch_dec09a.ino, for trying out and
+#benchmarking Dress without the hardware. it sits on the far end of a
+#pseudo-terminal, so Dress talks to it through pyserial exactly as it would
+#to the real board. it is written separately from dress.py on purpose: it
+#decodes frames the way the sketch does, so it catches mistakes in dress.py's
+#encoding instead of sharing them
+import os
+import sys
+import select
+import pty
+import tty
+import termios
+import fcntl
+import struct
+import threading
+import time
+
+clock=getattr(time,'monotonic',time.time)
+
+#termios speed constants to baud rates. on linux they are codes (B9600 is
+#13), on the mac the rates themselves
+ttySpeeds=dict((getattr(termios,name),int(name[1:])) for name in dir(termios)\
+               if name[0]=='B' and name[1:].isdigit())
+#rates that have no constant, such as 250000, are set with linux's
+#TCSETS2 ioctl and read back with TCGETS2, as a struct termios2
+bother=0o010000
+tcgets2=0x802C542A
+termios2=struct.Struct('IIIIB19sII')
+
+frameStart=0xA5
+setPinsFrame=0x01
+pingFrame=0x02
+pongFrame=0x03
+baudFrame=0x04
+confirmFrame=0x05
+
+class FakeArduino:
+    def __init__(self,maxBaud=1000000):
+        #bytes faster than maxBaud come out garbled, like a link that
+        #cannot keep up
+        self.maxBaud=maxBaud
+        self.baud=9600 #the sketch always starts here
+        self.previousBaud=9600
+        self.baudDeadline=None
+        (self.master,self.slave)=pty.openpty()
+        tty.setraw(self.slave) #pass every byte through untouched
+        self.port=os.ttyname(self.slave)
+        self.pins={} #pin: value, as the board would show them now
+        #(time applied, bytes, [(pin,value)...]) of every SET_PINS frame
+        self.frames=[]
+        self.badFrames=0
+        self.state='start'
+        self.running=True
+        self.thread=threading.Thread(target=self.run)
+        self.thread.daemon=True
+        self.thread.start()
+
+    def byteTime(self):
+        #seconds one byte takes on the wire: a start bit, 8 data bits and a
+        #stop bit
+        return 10/self.baud
+
+    def hostBaud(self):
+        #the rate dress.py has set on its end of the pty, or None if it
+        #cannot be told on this system
+        speed=termios.tcgetattr(self.slave)[5]
+        if speed==bother and sys.platform.startswith('linux'):
+            try:
+                found=fcntl.ioctl(self.slave,tcgets2,b'\0'*termios2.size)
+            except (IOError,OSError):
+                return None
+            return termios2.unpack(found)[7]
+        return ttySpeeds.get(speed)
+
+    def garbled(self):
+        #bytes come out as noise when the two ends disagree on the baud
+        #rate, or when it is faster than the board handles
+        host=self.hostBaud()
+        return self.baud>self.maxBaud or (host!=None and host!=self.baud)
+
+    def run(self):
+        while self.running:
+            #like the sketch's loop, give up on an unconfirmed baud rate
+            #even when nothing arrives
+            if self.baudDeadline!=None and clock()>self.baudDeadline:
+                self.switchBaud(self.previousBaud)
+                self.baudDeadline=None
+            #wait a little at a time, so close() is noticed
+            if not select.select([self.master],[],[],0.05)[0]:
+                continue
+            try:
+                #about a millisecond's worth of bytes at a time, as fast as
+                #the baud rate delivers them; the rest waits in the pty,
+                #which pushes back on the writer once it is full, as the
+                #real usb link does
+                data=bytearray(os.read(self.master,max(1,self.baud//10000)))
+            except OSError:
+                break
+            time.sleep(len(data)*self.byteTime())
+            if self.garbled():
+                data=bytearray(os.urandom(len(data)))
+            for byte in data:
+                self.feed(byte)
+
+    def feed(self,byte):
+        #the sketch's state machine
+        if self.state=='start':
+            if byte==frameStart:
+                self.state='type'
+        elif self.state=='type':
+            self.kind=self.check=byte
+            self.state='length'
+        elif self.state=='length':
+            self.length=byte
+            self.check^=byte
+            self.payload=bytearray()
+            self.state='payload' if byte>0 else 'check'
+        elif self.state=='payload':
+            self.payload.append(byte)
+            self.check^=byte
+            if len(self.payload)==self.length:
+                self.state='check'
+        else:
+            if byte==self.check:
+                self.apply()
+            else:
+                self.badFrames+=1
+            self.state='start'
+
+    def apply(self):
+        payload=self.payload
+        if self.kind==setPinsFrame:
+            pairs=[(payload[i],payload[i+1])\
+                   for i in range(0,len(payload)-1,2)]
+            self.pins.update(pairs)
+            self.frames.append((clock(),len(payload)+4,pairs))
+        elif self.kind==pingFrame:
+            self.send(pongFrame,payload)
+        elif self.kind==baudFrame and len(payload)==4:
+            self.send(pongFrame,payload)
+            self.previousBaud=self.baud
+            self.switchBaud(struct.unpack('<I',bytes(payload))[0])
+            self.baudDeadline=clock()+1
+        elif self.kind==confirmFrame:
+            self.baudDeadline=None #only this keeps the new baud rate
+            self.send(pongFrame,payload)
+
+    def send(self,kind,payload):
+        frame=bytearray([frameStart,kind,len(payload)])+payload
+        check=kind^len(payload)
+        for byte in payload:
+            check^=byte
+        frame.append(check)
+        if self.garbled():
+            frame=bytearray(os.urandom(len(frame)))
+        time.sleep(len(frame)*self.byteTime())
+        os.write(self.master,bytes(frame))
+
+    def switchBaud(self,baud):
+        self.baud=baud
+        self.state='start'
+
+    def close(self):
+        #the thread still uses the pty, so it goes first
+        self.running=False
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+if __name__=='__main__':
+    fake=FakeArduino()
+    print('fake arduino on',fake.port,'- try: python dress.py show --port',\
+          fake.port)
+    try:
+        while True:
+            time.sleep(1)
+            print('%d frames, %d bad, %d baud'%\
+                  (len(fake.frames),fake.badFrames,fake.baud))
+    except KeyboardInterrupt:
+        fake.close()
@@ -0,0 +1,608 @@
+from __future__ import print_function,division
+#the on-screen preview: a 3d model of the dress that lights up with the
+#music, bars showing the color and loudness, and the controls for the
+#patterns and color modes. it needs visual (vpython 6) and wx, which the
+#rest of the program never imports, so the garment can run headless
+#("dress.py run") on a board with no display
+from visual import *
+import wx
+import threading
+import numpy
+from dress import Audio,Analyzer,ColorHistory,Dress,GarmentLayout,\
+                  clock,colorMappers,loadPalettes
+
+class Model:
+    def __init__(self,rgbColor,layout):
+        self.skinColor=(0.93,0.80,0.68)
+        self.red=rgbColor[0]
+        self.green=rgbColor[1]
+        self.blue=rgbColor[2]
+        self.axis=(0,0.7,0)
+        self.frame=frame()
+        self.dressPattern='waterfall'
+        self.layout=layout
+        #hoops above the waist in each pattern; the rest are below it
+        self.topNumberOfHoops=layout.topNumberOfHoops
+
+    def findRGBTuple(self):
+        self.rgbColor=(self.red,self.green,self.blue)
+
+    def initLEDColors(self):
+        #the color every hoop of each pattern shows, one row per hoop, so
+        #a pattern's colors are set with one array operation. every color
+        #change makes visual redraw, so only the hoops whose color really
+        #changed are touched
+        self.LEDs={'waterfall':self.LEDSpirals,'fireworks':self.LEDPoints}
+        self.LEDColors={}
+        for (pattern,hoops) in self.LEDs.items():
+            self.LEDColors[pattern]=numpy.tile(numpy.array(self.rgbColor,\
+                                               dtype=float),(len(hoops),1))
+
+    def setLEDColors(self,which,colors):
+        #hoops which of the current pattern change to colors (one row each)
+        shown=self.LEDColors[self.dressPattern]
+        changed=(shown[which]!=colors).any(axis=1)
+        which=which[changed]
+        shown[which]=colors[changed]
+        hoops=self.LEDs[self.dressPattern]
+        for (i,color) in zip(which.tolist(),shown[which].tolist()):
+            hoops[i].color=tuple(color)
+
+    def drawTrunk(self):
+        f=self.frame
+        cylinder(frame=f,pos=(0,-0.3,0),axis=self.axis,radius=0.05,length=1,\
+                 color=self.skinColor)
+
+    def drawHead(self):
+        f=self.frame
+        sphere(frame=f,pos=(0,0.7,0),radius=0.2,color=self.skinColor)
+
+    def drawLimbs(self):
+        f=self.frame
+        #arm 1
+        curve(frame=f,pos=[(-0.1,0.35,0), (-0.4,0.2,0), (-0.1,0.05,0)],\
+              radius=0.05,color=self.skinColor)
+        #elbow1
+        sphere(frame=f,pos=(-0.4,0.2,0),radius=0.047,color=self.skinColor)
+        #arm 2
+        curve(frame=f,pos=[(0.1,0.35,0), (0.4,0.2,0),(0.1,0.05,0)],\
+              radius=0.05,color=self.skinColor)
+        #elbow2
+        sphere(frame=f,pos=(0.4,0.2,0),radius=0.047,color=self.skinColor)
+        #thigh 1
+        curve(frame=f,pos=[(-0.1,-0.3,0),(-0.06,-0.8,0)],radius=0.07,\
+              color=self.skinColor)
+        #knee 1
+        sphere(frame=f,pos=(-0.06,-0.83,0), radius=0.069, \
+               color=self.skinColor)
+        #calf 1
+        ellipsoid(frame=f,pos=(-0.06,-1,0), length=0.11, height=0.6, \
+                  width=0.13,color=self.skinColor)
+        #foot 1
+        ellipsoid(frame=f,pos=(-0.06,-1.27,0.08),length=0.1,height=0.07,\
+                  width=0.23,color=color.white)
+        #thigh 2
+        curve(frame=f,pos=[(0.1,-0.3,0),(0.094,-0.8,0)],radius=0.07,\
+              color=self.skinColor)
+        #knee 2
+        sphere(frame=f,pos=(0.094,-0.83,0), radius=0.069, \
+               color=self.skinColor)
+        #calf 2
+        ellipsoid(frame=f,pos=(0.094,-1,0), length=0.11, height=0.6,\
+                  width=0.13,color=self.skinColor)
+        #foot 2
+        ellipsoid(frame=f,pos=(0.094,-1.27,0.08),length=0.1,height=0.07,\
+                  width=0.23,color=color.white)
+
+    def drawDress(self):
+        #the white template
+        f=self.frame
+        for (height,radius) in self.layout.template.tolist():
+            ring(frame=f,pos=(0,height,0),axis=(0,0.4,0),radius=radius,\
+                 thickness=self.layout.templateThickness)
+
+    def drawLabels(self):
+        self.title=label(pos=self.axis,color=(1,1,1),\
+                         text='Musical Dress Display',\
+                            box=False,line=False,opacity=0,xoffset=0,\
+                            yoffset=60)
+
+    def drawLEDSpirals(self):
+        #when lightup mode is 'waterfall'
+        self.findRGBTuple()
+        f=self.frame
+        self.LEDSpirals=[ring(frame=f,pos=(0,height,0),axis=(0,0.4,0),\
+                              radius=radius,\
+                              thickness=self.layout.spiralThickness,\
+                              color=self.rgbColor)\
+                         for (height,radius) in self.layout.spirals.tolist()]
+
+    def drawLEDPoints(self):
+        #when lightup mode is 'fireworks'
+        self.findRGBTuple()
+        f=self.frame
+        self.LEDPoints=[points(frame=f,pos=hoop.tolist(),color=self.rgbColor)\
+                        for hoop in self.layout.points]
+
+    def draw(self):
+        self.drawTrunk()
+        self.drawDress()
+        self.drawHead()
+        self.drawLimbs()
+        self.drawLabels()
+        self.drawLEDSpirals()
+        self.drawLEDPoints()
+        for point in self.LEDPoints:
+            point.visible=False
+        self.initLEDColors()
+
+
+class Bars:
+    def __init__(self,rgbColor,loudness):
+        self.red=rgbColor[0]
+        self.green=rgbColor[1]
+        self.blue=rgbColor[2]
+        self.frame=frame()
+        self.axis=(0,1,0)
+        self.loudness=loudness
+        self.rgbSum=self.red+self.green+self.blue
+
+    def drawRedBar(self):
+        self.redBar=cylinder(frame=self.frame,pos=(-1,-2,0),\
+                             axis=(0,self.red*10,0),\
+                 radius=1,color=color.red,length=self.red*10,\
+                             opacity=self.loudness)
+
+    def drawGreenBar(self):
+        self.greenBar=cylinder(frame=self.frame,pos=(1,-2,0),\
+                               axis=(0,self.green*10,0),\
+                 radius=1,color=color.green,length=self.green*10,\
+                               opacity=self.loudness)
+
+    def drawBlueBar(self):
+        self.blueBar=cylinder(frame=self.frame,pos=(0,-2,-(3**0.5)),\
+                              axis=(0,self.blue*10,0),\
+                 radius=1,color=color.blue,length=self.blue*10,\
+                              opacity=self.loudness)
+        
+    def drawLabels(self):
+        self.redLabel=label(pos=self.axis,color=(1,1,1),text='% of red',\
+                            box=False,line=False,opacity=0,xoffset=-60,\
+                            yoffset=-60)
+        self.redness=label(pos=self.axis,color=(1,1,1),\
+                           text='%0.2f'%(self.red/self.rgbSum*100)+'%',\
+                            box=False,line=False,opacity=0,xoffset=20,\
+                            yoffset=-60)
+        self.blueLabel=label(pos=self.axis,color=(1,1,1),text='% of blue',\
+                             box=False,line=False,opcaity=0,xoffset=-58,\
+                             yoffset=-80)
+        self.blueness=label(pos=self.axis,color=(1,1,1),\
+                            text='%0.2f'%(self.green/self.rgbSum*100)+'%',\
+                             box=False,line=False,opcaity=0,xoffset=20,\
+                             yoffset=-80)
+        self.greenLabel=label(pos=self.axis,color=(1,1,1),text='% of green',\
+                              box=False,line=False,opacity=0,xoffset=-53,\
+                              yoffset=-100)
+        self.greenness=label(pos=self.axis,color=(1,1,1),\
+                             text='%0.2f'%(self.blue/self.rgbSum*100)+'%',\
+                              box=False,line=False,opacity=0,xoffset=20,\
+                              yoffset=-100)
+
+    def draw(self):
+        self.drawRedBar()
+        self.drawGreenBar()
+        self.drawBlueBar()
+        self.drawLabels()
+
+class Window:
+    def __init__(self,data):
+        self.w=data.w
+        self.L=data.L #half the length of the window
+        self.margin=data.margin
+        self.p=self.w.panel
+        #the full region of the window in which to place widgets
+        self.p.SetBackgroundColour('#000000') #black
+
+    def staticTexts1(self):
+        self.frequencyDetectorText=wx.StaticText(self.p,\
+                      pos=(1.6*self.L,self.L*0.4),\
+                      label="Frequency Detector")
+        self.frequencyDetectorText.SetFont(wx.Font(22,wx.SCRIPT,wx.NORMAL,\
+                                                   wx.BOLD))
+        self.frequencyDetectorText.SetForegroundColour((255,255,255))
+        self.barsText=wx.StaticText(self.p,\
+                                    pos=(1.5*(self.L+self.margin*2),\
+                                         self.L-self.margin*3),\
+                                    label="Red,Green,Blue Distribution")
+        self.barsText.SetForegroundColour((255,255,255))
+        self.detectFreqText=wx.StaticText(self.p,\
+                            pos=(self.L,self.margin*5),\
+                            label="Detect Sound Frequency")
+        self.detectFreqText.SetForegroundColour((255,255,255))
+        self.detectFreqText.SetFont(wx.Font(16,wx.SCRIPT,wx.NORMAL,\
+                                                   wx.BOLD))
+    def staticTexts2(self):
+        self.dressPatternText=wx.StaticText(self.p,\
+                                        pos=(self.margin*2.5,self.margin),\
+                                        label='Choose a Dress Pattern')
+        self.dressPatternText.SetForegroundColour((255,255,255))
+        self.colorModeText=wx.StaticText(self.p,\
+                                pos=(self.L+self.margin/5,self.margin),\
+                                label='Choose a Color Mode ')
+        self.colorModeText.SetForegroundColour((255,255,255))
+        self.modeText=wx.StaticText(self.p,\
+                                    pos=(self.L*1.8,self.margin),\
+                                    label="Choose a Light-up Mode")
+        self.modeText.SetForegroundColour((255,255,255))
+        self.dressText=wx.StaticText(self.p,\
+                                     pos=(self.L*1.63,self.L*1.74),\
+                                     label='Choose a Light-up Mode')
+        self.dressText.SetForegroundColour((255,255,255))
+
+    def staticTexts(self):
+        self.staticTexts1()
+        self.staticTexts2()
+        
+    def freqText(self,data):
+        self.fText=wx.StaticText(self.p,pos=\
+                                (1.54*self.L,self.L*0.5)\
+                                 ,label='')
+        self.fText.SetFont(wx.Font(74, wx.MODERN,wx.NORMAL,wx.BOLD))
+
+    def displayCheckBox(self):
+        self.checkBox=wx.CheckBox(self.p,label="",\
+                                  pos=(self.L-self.margin*1.5,self.margin*5))
+
+    def displayComboBox(self):
+        choices=['Select Color Mode']+\
+                [label for (label,findColor) in colorMappers.values()]
+        self.comboBox=wx.ComboBox(self.p,choices=choices,pos=\
+                                  (self.L-self.margin/2,self.margin*2.2))
+
+    def displayRadioBox(self):
+        choices1=['Waterfall Pattern','Fireworks Pattern']
+        self.radioBox1=wx.RadioBox(self.p,choices=choices1,\
+                                  pos=(self.margin,self.margin*2),
+                                  style=wx.RA_SPECIFY_ROWS,\
+                                  size=(self.L/1.5,self.L/4.5))
+        self.radioBox1.SetBackgroundColour((255,255,255))
+        choices2=['Dropping Mode','Expanding Mode']
+        self.radioBox2=wx.RadioBox(self.p,choices=choices2,\
+                                   pos=(self.L*1.7,self.margin*2),\
+                                   style=wx.RA_SPECIFY_ROWS,\
+                                   size=(self.L/1.5,self.L/4.5))
+        self.radioBox2.SetBackgroundColour((255,255,255))
+        choices3=['Demo Mode','Current Mode']
+        self.radioBox3=wx.RadioBox(self.p,choices=choices3,\
+                                   pos=(self.L*1.6,self.L*1.8),\
+                                   style=wx.RA_SPECIFY_ROWS,\
+                                   size=(self.L/2,self.L/5))
+        self.radioBox3.SetBackgroundColour((255,255,255))
+
+    def displayShowDressButton(self):
+        self.showDressButton=wx.Button(self.p,pos=(self.L*2.18,self.L*1.85),\
+                                  label="Light Up!")
+        
+    def display(self,data):
+        self.displayCheckBox()
+        self.displayComboBox()
+        self.displayRadioBox()
+        self.displayShowDressButton()
+        self.staticTexts()
+        self.freqText(data)
+
+def initData(data):
+    data.L=320
+    data.margin=20
+    data.sound=Audio(data.detector,hopSize=data.hopSize)
+    #analyses the sound on its own thread; the display shows the newest
+    #analysis it has not shown yet
+    data.analyzer=Analyzer(data.sound)
+    data.analysis=None
+    data.seen=0
+    #anything below -50db is definitely silence
+    #data.loudness: a scale of loudness from 0(no sound) to 1(maximum sound)
+    #begin with 0.375, which is silence
+    data.loudness=0.375
+    data.loudnessInterval=9
+    #colors of the last few frames, one for every hoop the model can show
+    data.colorHistory=ColorHistory(max(len(data.layout.spirals),\
+                                       len(data.layout.points)))
+    data.colorModeSelected=False
+    data.colorMode=None
+    data.mode='dropping'
+    data.rgbColor=(1,1,1)
+    data.dressShow=False
+    data.dressMode='demo'
+    data.i=0
+    data.dress=Dress(data.port,data.baud,data.layout)
+    data.dress.results=data.analyzer.results #one analysis for both
+    data.dressThread=None #runDress, once the dress is lit
+
+def initWindow(data):
+    initData(data)
+    data.w=window(width=2.5*(data.L+window.dwidth),\
+                  height=2*(data.L+window.dheight+window.menuheight),\
+                  menus=True,title='Musical Garment',\
+                  style=wx.SYSTEM_MENU | wx.CAPTION | wx.CLOSE_BOX|\
+                  wx.FRAME_EX_METAL)
+    data.screen1=display(window=data.w,x=0,y=data.margin*6,\
+                         width=data.L*1.5,height=data.L*1.6,\
+                         forward=-vector(0,0,4))
+    data.screen2=display(window=data.w,x=1.6*data.L,\
+                         y=data.L*0.9,\
+                         width=data.L-4*data.margin,\
+                         height=data.L-4*data.margin,\
+                         forward=-vector(0,0.15,-0.1))
+    data.window=Window(data)
+    data.window.display(data) #all the widgets
+    data.screen1.select()
+    data.model=Model(data.rgbColor,data.layout)
+    data.model.draw()
+    data.screen2.select()
+    data.bars=Bars(data.rgbColor,data.loudness)
+    #loudness determines the bars' opacity
+    data.bars.draw()
+
+def calculateLoudness(data):
+    #typical loundness ranges from -80dB to 0dB
+    #make the loudness value positive by adding 80
+    #now the higher the value, the louder
+    positiveLoudness=data.shownLoudness+80
+    silence=30
+    maxLoudness=80
+    data.loudness=positiveLoudness/80
+    #determine qualitatively how loud a sound is
+    #the louder, the smaller the loudness level
+    if positiveLoudness<=silence:
+        loudnessLevel=5
+    elif silence<positiveLoudness<=\
+         silence+2*data.loudnessInterval:
+        loudnessLevel=3
+    else:
+        loudnessLevel=1
+    return loudnessLevel
+
+def mousePressed(data):
+    def toggleAudio(evt):
+        choice=data.window.checkBox.GetValue()
+        if choice==False:
+            data.analyzer.stop()
+        else:
+            #open the device here, once, rather than on every frame
+            data.analyzer.start()
+
+    def selectDressPattern(evt):
+        choice=data.window.radioBox1.GetSelection()
+        if choice==0:
+            data.colorHistory.clear() #turn the dress white
+            if data.model.dressPattern=='fireworks':
+                for point in data.model.LEDPoints:
+                    point.visible=False
+            data.model.dressPattern='waterfall'
+            for spiral in data.model.LEDSpirals:
+                spiral.visible=True
+        else:
+            data.colorHistory.clear() #turn the dress white
+            if data.model.dressPattern=='waterfall':
+                for spiral in data.model.LEDSpirals:
+                    spiral.visible=False 
+            data.model.dressPattern='fireworks'
+            for point in data.model.LEDPoints:
+                point.visible=True
+
+    def selectMode(evt):
+        choice=data.window.radioBox2.GetSelection()
+        if choice==0:
+            data.colorHistory.clear()
+            data.mode='dropping'
+        if choice==1:
+            data.colorHistory.clear()
+            data.mode='expanding'
+
+    def selectColorMode(evt):
+        choice=data.window.comboBox.GetSelection()
+        if choice==0:
+            data.colorModeSelected=False
+        else:
+            data.colorModeSelected=True
+            data.colorMode=list(colorMappers)[choice-1]
+
+    def selectDressMode(evt):
+        choice=data.window.radioBox3.GetSelection()
+        if choice==0:
+            data.dressMode='demo'
+        else:
+            data.dressMode=data.mode
+
+    def lightUp(evt):
+        #one animation at a time: two would share the dress's frame and
+        #schedule and their frames would interleave
+        if data.dressThread!=None and data.dressThread.is_alive():
+            return
+        data.w.visible=False #hide the main window
+        data.analyzer.start() #the dress needs the microphone
+        #the dress has a thread of its own, so a slow serial link never
+        #holds up the display or the analysis
+        data.dressThread=threading.Thread(target=runDress,args=(data,))
+        data.dressThread.daemon=True
+        data.dressThread.start()
+
+    data.window.checkBox.Bind(wx.EVT_CHECKBOX, toggleAudio)
+    data.window.radioBox1.Bind(wx.EVT_RADIOBOX,selectDressPattern)
+    data.window.radioBox2.Bind(wx.EVT_RADIOBOX,selectMode)
+    data.window.comboBox.Bind(wx.EVT_COMBOBOX,selectColorMode)
+    data.window.showDressButton.Bind(wx.EVT_BUTTON,lightUp)
+    data.window.radioBox3.Bind(wx.EVT_RADIOBOX,selectDressMode)
+
+def determineRgbBasingOnMode(data):
+    #rgbcodes are different for each color mode
+    if data.colorMode in data.sound.colors.tables:
+        rgb=data.sound.colors.lookup(data.colorMode,data.shownMidi)
+        data.rgbColor=tuple(rgb.tolist())
+
+def findCurrentColor(data):
+    if data.colorMode!='multicolor':
+        (i,j,k)=data.rgbColor
+        currentColor=(i*255,j*255,k*255)
+    else:
+        currentColor=data.analysis.colorName
+    return currentColor
+        
+def showDetectedFrequency(data):
+    data.window.fText.SetLabel("%0.2f"%data.analysis.midi)
+    #the color of the text is black so that the background color can be
+    #easily seen
+    data.window.fText.SetForegroundColour((0,0,0))
+    #background corresponds to the frequency detected
+    if data.model.dressPattern!=None and data.colorModeSelected==True:
+        data.window.fText.SetBackgroundColour(findCurrentColor(data))
+    else:
+        data.window.fText.SetBackgroundColour((255,255,255))
+
+def gatherDetectedFreq(data):
+    #the newest color goes on the top hoop (dropping) or the waist hoops
+    #(expanding) and every older one moves along a hoop
+    data.colorHistory.push(data.rgbColor)
+
+def dressChangeColor(data):
+    step=calculateLoudness(data)
+    model=data.model
+    if model.dressPattern not in model.LEDColors:
+        return
+    hoops=len(model.LEDColors[model.dressPattern])
+    if data.mode=='dropping':
+        (which,colors)=data.colorHistory.dropping(hoops)
+    elif data.mode=='expanding':
+        top=model.topNumberOfHoops[model.dressPattern]
+        (which,colors)=data.colorHistory.expanding(top,hoops)
+    else:
+        return
+    model.setLEDColors(which,colors)
+
+def dressChange(data):
+    data.screen1.select()
+    gatherDetectedFreq(data)
+    dressChangeColor(data)
+    
+def barsChangeHeight(data):
+    #height changes with frequency
+    data.bars.redBar.axis=(0,data.rgbColor[0]*10,0)
+    data.bars.redBar.height=data.rgbColor[0]
+    data.bars.greenBar.axis=(0,data.rgbColor[1]*10,0)
+    data.bars.greenBar.height=data.rgbColor[1]
+    data.bars.blueBar.axis=(0,data.rgbColor[2]*10,0)
+    data.bars.blueBar.height=data.rgbColor[2]
+
+def barsChangeOpacity(data):
+    #opacity changes with loudness
+    data.bars.redBar.opacity=data.loudness
+    data.bars.greenBar.opacity=data.loudness
+    data.bars.blueBar.opacity=data.loudness
+
+def barsChangeLabel(data):
+    rgbSum=data.rgbColor[0]+data.rgbColor[1]+data.rgbColor[2]
+    data.bars.redness.text='%0.2f'%(data.rgbColor[0]/rgbSum*100)+'%'
+    data.bars.greenness.text='%0.2f'%(data.rgbColor[1]/rgbSum*100)+'%'
+    data.bars.blueness.text='%0.2f'%(data.rgbColor[2]/rgbSum*100)+'%'
+
+def barsChange(data):
+    data.screen2.select()
+    barsChangeHeight(data)
+    barsChangeOpacity(data)
+    barsChangeLabel(data)
+
+def runDress(data):
+    if not data.dress.isConnected():
+        data.dress.connect()
+        print('dress connected:',data.dress.link)
+    if data.dressMode=='demo':
+        data.dress.dressDemo()
+    elif data.dressMode=='dropping':
+        data.dress.dressLightUpInMode1()
+    elif data.dressMode=='expanding':
+        data.dress.dressLightUpInMode2()
+
+class Fade:
+    #eases a value from where it is towards each new target, so something
+    #drawn at a fixed frame rate moves smoothly between updates that come at
+    #their own pace. each fade lasts about as long as the recent gaps
+    #between targets, so it neither stops short when the updates come slowly
+    #nor lags behind when they come quickly, but never less than shortest:
+    #a frame, so a jump is spread over more than one
+    def __init__(self,duration,shortest=0):
+        self.duration=duration #seconds
+        self.shortest=shortest
+        self.start=self.target=None
+        self.started=None #when the current fade began
+
+    def set(self,target,now):
+        if self.target==None:
+            self.start=target
+        else:
+            self.start=self.value(now)
+            gap=now-self.started
+            self.duration+=0.2*(gap-self.duration)
+        self.target=target
+        self.started=now
+
+    def value(self,now):
+        #None until there is a target
+        if self.target==None:
+            return None
+        done=min(1,(now-self.started)/max(self.duration,self.shortest,1e-6))
+        return self.start+(self.target-self.start)*done
+
+def runVisual(port='/dev/cu.usbmodem1411',baud=None,layout=None,\
+              detector='fft',hopSize=1024):
+    class Struct: pass
+    data=Struct()
+    data.detector=detector #one of pitchDetectors
+    data.hopSize=hopSize
+    data.port=port
+    data.baud=baud
+    data.layout=layout if layout!=None else GarmentLayout()
+    initWindow(data)
+    mousePressed(data)
+    #the preview is drawn frameRate times a second whatever rate analyses
+    #arrive at; in between, pitch and loudness fade from one to the next
+    data.frameRate=20
+    hop=data.sound.hopSize/data.sound.rate
+    data.pitchFade=Fade(hop,1/data.frameRate)
+    data.loudnessFade=Fade(hop,1/data.frameRate)
+    while True:
+        rate(data.frameRate)
+        #rotate the model
+        data.model.frame.rotate(axis=data.model.axis,angle=2*pi/100)
+        #rotate the bars
+        data.bars.frame.rotate(axis=data.bars.axis,angle=2*pi/100)
+        if not data.analyzer.isRunning():
+            continue
+        now=clock()
+        #the newest analysis, if there is one this frame has not seen. any
+        #that came and went since the last frame are skipped
+        (version,analysis)=data.analyzer.results.latest()
+        if version!=data.seen:
+            data.seen=version
+            data.analysis=analysis
+            if analysis.midi!=None:
+                data.pitchFade.set(analysis.midi,now)
+            data.loudnessFade.set(analysis.loudness,now)
+            showDetectedFrequency(data)
+        if data.analysis==None:
+            continue #nothing analysed yet
+        data.shownMidi=data.pitchFade.value(now)
+        data.shownLoudness=data.loudnessFade.value(now)
+        if data.colorModeSelected==False or data.colorMode==None or \
+           data.model.dressPattern==None:
+            continue
+        determineRgbBasingOnMode(data)
+        calculateLoudness(data)
+        #show color of the dress (corresponds to the frequency detected)
+        dressChange(data)
+        #show change of heights of the bars
+        barsChange(data)
+
+if __name__=='__main__':
+    loadPalettes()
+    runVisual()
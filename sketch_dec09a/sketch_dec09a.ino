@@ -1,6 +1,32 @@
+// frames from dress.py: 0xA5, type, payload length, payload, checksum
+// the checksum is the xor of the type, the length and every payload byte.
+// a frame that does not check out is dropped, so a glitch on the wire
+// never leaves half a row lit
+const byte FRAME_START = 0xA5;
+const byte SET_PINS = 0x01; // payload: pin,value pairs, applied together
+const byte PING = 0x02;     // answered with a PONG carrying the same payload
+const byte PONG = 0x03;
+const byte BAUD = 0x04;     // payload: new baud rate, 4 bytes little-endian
+const byte CONFIRM = 0x05;  // payload: the new baud rate again, keeps it
+
+enum {WAIT_START, READ_TYPE, READ_LENGTH, READ_PAYLOAD, READ_CHECK};
+byte state = WAIT_START;
+byte frameType;
+byte frameLength;
+byte frameCheck;
+byte payload[255];
+int received = 0;
+
+// after a baud change, go back to the old rate unless a CONFIRM arrives
+// at the new one within a second. other frames do not count: a ping can
+// get through on a link that garbles the bigger frames that follow
+long baud = 9600;
+long previousBaud = 9600;
+unsigned long baudDeadline = 0;
+
 void setup() {
   // put your setup code here, to run once:
-  Serial.begin(9600);
+  Serial.begin(baud);
   pinMode(2, OUTPUT);
   pinMode(3, OUTPUT);
   pinMode(4, OUTPUT);
@@ -51,62 +77,93 @@ void setup() {
 
 }
 
-void loop() {
-  // put your main code here, to run repeatedly:
-  while (Serial.available() > 0) {
-    int redPin1 = Serial.parseInt();
-    int red = Serial.parseInt();
-    int greenPin1 = Serial.parseInt();
-    int green = Serial.parseInt();
-    int bluePin1 = Serial.parseInt();
-    int blue = Serial.parseInt();
-    /*int redPin2 = Serial.parseInt();
-      int greenPin2 = Serial.parseInt();
-      int bluePin2 = Serial.parseInt();*/
-    if (Serial.read() == '\n') {
-      analogWrite(redPin1, red);
-      analogWrite(greenPin1, green);
-      analogWrite(bluePin1, blue);
-      /*analogWrite(redPin2, red);
-        analogWrite(greenPin2, green);
-        analogWrite(bluePin2, blue);*/
-      delay(100);
-      /*digitalWrite(redPin1, LOW);
-      digitalWrite(greenPin1, LOW);
-      digitalWrite(bluePin1, LOW);*/
+void sendFrame(byte type, byte *data, byte length) {
+  byte check = type ^ length;
+  Serial.write(FRAME_START);
+  Serial.write(type);
+  Serial.write(length);
+  for (int i = 0; i < length; i++) {
+    Serial.write(data[i]);
+    check ^= data[i];
+  }
+  Serial.write(check);
+}
 
-      /*digitalWrite(redPin2, LOW);
-        digitalWrite(greenPin2, LOW);
-        digitalWrite(bluePin2, LOW);*/
-    }
-    else {
-      int redPin2 = Serial.parseInt();
-      int greenPin2 = Serial.parseInt();
-      int bluePin2 = Serial.parseInt();
-      if (Serial.read() == '\n') {
-        analogWrite(redPin1, red);
-        analogWrite(greenPin1, green);
-        analogWrite(bluePin1, blue);
-        analogWrite(redPin2, red);
-        analogWrite(greenPin2, green);
-        analogWrite(bluePin2, blue);
-        delay(100);
-        /*digitalWrite(redPin1, LOW);
-        digitalWrite(greenPin1, LOW);
-        digitalWrite(bluePin1, LOW);
+void switchBaud(long newBaud) {
+  Serial.flush(); // let the reply go out at the old rate first
+  Serial.end();
+  Serial.begin(newBaud);
+  baud = newBaud;
+}
 
-        digitalWrite(redPin2, LOW);
-        digitalWrite(greenPin2, LOW);
-        digitalWrite(bluePin2, LOW);*/
-      }
+void applyFrame() {
+  if (frameType == SET_PINS) {
+    for (int i = 0; i + 1 < frameLength; i += 2) {
+      analogWrite(payload[i], payload[i + 1]);
     }
   }
-  /*while (Serial.available()>0){
-    int pin =Serial.parseInt();
-    int brightness =Serial.parseInt();
-    analogWrite(pin,brightness);
-    delay(500);
-    digitalWrite(pin,LOW);
-    }*/
+  else if (frameType == PING) {
+    sendFrame(PONG, payload, frameLength);
+  }
+  else if (frameType == BAUD && frameLength == 4) {
+    long newBaud = (long)payload[0] | ((long)payload[1] << 8) |
+                   ((long)payload[2] << 16) | ((long)payload[3] << 24);
+    sendFrame(PONG, payload, frameLength);
+    previousBaud = baud;
+    switchBaud(newBaud);
+    state = WAIT_START;
+    baudDeadline = millis() + 1000;
+    if (baudDeadline == 0) {
+      baudDeadline = 1;
+    }
+  }
+  else if (frameType == CONFIRM) {
+    baudDeadline = 0;
+    sendFrame(PONG, payload, frameLength);
+  }
+}
 
+void loop() {
+  // put your main code here, to run repeatedly:
+  if (baudDeadline != 0 && (long)(millis() - baudDeadline) > 0) {
+    // nothing made sense at the new rate
+    switchBaud(previousBaud);
+    baudDeadline = 0;
+    state = WAIT_START;
+  }
+  // read whatever has arrived without waiting, one byte at a time
+  while (Serial.available() > 0) {
+    byte b = Serial.read();
+    switch (state) {
+      case WAIT_START:
+        if (b == FRAME_START) {
+          state = READ_TYPE;
+        }
+        break;
+      case READ_TYPE:
+        frameType = b;
+        frameCheck = b;
+        state = READ_LENGTH;
+        break;
+      case READ_LENGTH:
+        frameLength = b;
+        frameCheck ^= b;
+        received = 0;
+        state = frameLength > 0 ? READ_PAYLOAD : READ_CHECK;
+        break;
+      case READ_PAYLOAD:
+        payload[received++] = b;
+        frameCheck ^= b;
+        if (received == frameLength) {
+          state = READ_CHECK;
+        }
+        break;
+      case READ_CHECK:
+        if (b == frameCheck) {
+          applyFrame();
+        }
+        state = WAIT_START;
+        break;
+    }
+  }
 }